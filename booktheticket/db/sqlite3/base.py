@@ -0,0 +1,60 @@
+"""
+SQLite tuned for several concurrent writers (single box / edge venues).
+
+Use it as ``ENGINE: "booktheticket.db.sqlite3"``.  On top of Django's
+backend it understands these ``OPTIONS``:
+
+* ``journal_mode`` (default ``"WAL"``): readers no longer block the
+  writer and the writer no longer blocks readers.
+* ``synchronous`` (default ``"NORMAL"``): in WAL mode this only fsyncs
+  at checkpoints; a power cut can lose the last commits but never
+  corrupts the database.
+* ``transaction_mode`` (default ``"IMMEDIATE"``): ``atomic()`` blocks
+  start with ``BEGIN IMMEDIATE`` and take the write lock up front.  With
+  plain ``BEGIN`` two transactions that both read and then write
+  deadlock on the upgrade and one of them fails with "database is
+  locked" straight away, without waiting.  It also makes the
+  ``select_for_update()`` in seat holds mean something, since SQLite
+  ignores ``FOR UPDATE``.
+* ``timeout`` (Django's own option, seconds): sqlite's
+  ``busy_timeout``, i.e. how long a writer queues for the lock before
+  giving up.
+
+Django 5.1+ ships ``transaction_mode`` natively; this keeps the same
+option name so the settings carry over.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+PRAGMA_DEFAULTS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+}
+TRANSACTION_MODES = {"DEFERRED", "IMMEDIATE", "EXCLUSIVE"}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # Ours, not sqlite3.connect()'s.
+        self.pragmas = {
+            name: kwargs.pop(name, default)
+            for name, default in PRAGMA_DEFAULTS.items()
+        }
+        mode = str(kwargs.pop("transaction_mode", "IMMEDIATE")).upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"transaction_mode must be one of {', '.join(sorted(TRANSACTION_MODES))}"
+            )
+        self.transaction_mode = mode
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            if value:
+                conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f"BEGIN {self.transaction_mode}")
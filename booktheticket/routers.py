@@ -0,0 +1,132 @@
+"""
+Database routing: seat shards, primary + read replicas.
+
+Seats and bookings are sharded by theater (see movies/shards.py); the
+``SeatShardRouter`` runs first and sends them to their theater's shard.
+
+Catalog reads (movies, theaters, recommendations) and reporting queries go to one of
+``settings.DATABASE_REPLICAS``; seat holds, bookings, users and sessions
+always use the primary.
+
+Replicas lag a little, so anybody who has just written something (a
+booking, a profile change) is pinned to the primary for
+``REPLICA_PIN_SECONDS`` to read their own writes.  The pin is carried in
+a cookie by ``PrimaryPinningMiddleware``.
+"""
+import contextvars
+import random
+import time
+
+from django.conf import settings
+
+from movies.shards import SHARDED_MODELS, shard_aliases, shard_of_instance
+
+CATALOG_MODELS = {"movies.movie", "movies.theater", "movies.movierecommendation"}
+PIN_COOKIE = "db_primary_until"
+
+_pinned = contextvars.ContextVar("db_pinned_to_primary", default=False)
+_wrote = contextvars.ContextVar("db_wrote", default=False)
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def read_db():
+    """Alias for catalog/reporting reads: a replica, unless pinned."""
+    pool = replicas()
+    if not pool or _pinned.get():
+        return "default"
+    return random.choice(pool)
+
+
+def pin_to_primary():
+    """Send the rest of this request (and the next few) to the primary."""
+    _pinned.set(True)
+    _wrote.set(True)
+
+
+class SeatShardRouter:
+    def _shard(self, model, hints):
+        if model._meta.label_lower not in SHARDED_MODELS:
+            return None
+        instance = hints.get("instance")
+        return shard_of_instance(instance) if instance is not None else None
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        shard = self._shard(model, hints)
+        if shard is not None:
+            _wrote.set(True)
+        return shard
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Seats and bookings point at theaters/movies/users on default
+        # (the foreign keys have no DB constraint for that reason).
+        pool = {"default", *replicas(), *shard_aliases()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == "default" or db not in shard_aliases():
+            return None
+        return f"{app_label}.{model_name}" in SHARDED_MODELS
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in CATALOG_MODELS:
+            return read_db()
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        # Session saves happen on nearly every request; they don't count.
+        if model._meta.app_label != "sessions":
+            _wrote.set(True)
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        pool = {"default", *replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas():
+            return False
+        return None
+
+
+class PrimaryPinningMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+
+        pinned_token = _pinned.set(pinned)
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            _pinned.reset(pinned_token)
+            _wrote.reset(wrote_token)
+
+        if wrote and replicas():
+            seconds = getattr(settings, "REPLICA_PIN_SECONDS", 15)
+            response.set_cookie(
+                PIN_COOKIE,
+                str(time.time() + seconds),
+                max_age=seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
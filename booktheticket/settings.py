@@ -24,7 +24,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = "django-insecure-^+7s8f(9p(i2_#cjb$qft(120&5r(1eory1t@if513r%38u=g5"
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get("DJANGO_DEBUG", "1") != "0"
 
 ALLOWED_HOSTS = [
     "127.0.0.1",
@@ -55,6 +55,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "booktheticket.routers.PrimaryPinningMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -70,18 +71,96 @@ EMAIL_HOST_PASSWORD = 'kjkk baun brvn fjag'
 
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Shared cache for the waiting room, rate-limit counters and warmed
+# fragments.  Set MEMCACHED_LOCATION (e.g. "127.0.0.1:11211", comma-separate
+# several servers) whenever more than one worker runs: LocMem is
+# per-process, and gunicorn.conf.py won't start several workers on it
+# while the waiting room is on.  LocMem's default 300 entries would also
+# cull queue state to make room for rate-limit counters.
+if os.environ.get('MEMCACHED_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ['MEMCACHED_LOCATION'].split(','),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+
+# 🎟 Waiting room in front of the seat page
+WAITING_ROOM_ENABLED = True
+WAITING_ROOM_MAX_ACTIVE = 50            # concurrent checkouts per theater
+WAITING_ROOM_ADMIT_GRACE_SECONDS = 60   # time to show up once admitted
+WAITING_ROOM_LEASE_SECONDS = 600        # slot lifetime while choosing seats
+WAITING_ROOM_AVG_CHECKOUT_SECONDS = 180 # used for the ETA shown in the queue
+WAITING_ROOM_STATE_SECONDS = 86400      # a queue nobody touches for this long is dropped
+
+# 🔐 Seat hold strategy: "pessimistic" (row locks) or "optimistic" (versioned
+# conditional updates). Compare with `manage.py benchmark_seat_holds`.
+SEAT_LOCKING = "pessimistic"
+
+# 🚦 Rate limits, keyed by "<view>:<user|ip>"; defaults live on the views
+RATELIMIT_ENABLED = True
+# Proxies in front of the app (Render/Vercel: one) that append the client
+# address to X-Forwarded-For; the entry that many from the right is the
+# client. Anything further left is whatever the client sent. 0 = REMOTE_ADDR.
+RATELIMIT_PROXY_HOPS = int(os.environ.get('RATELIMIT_PROXY_HOPS', '1'))
+RATELIMITS = {
+    # 'book_seats:user': '10/m',
+    # 'login_view:ip': '10/m',
+}
+
+# 💰 Seat prices (₹) per category, unless a show has its own ShowPrice rows
+DEFAULT_SEAT_PRICES = {
+    'standard': 200,
+    'premium': 300,
+    'recliner': 450,
+}
+
+# 🍿 "Also booked" neighbours kept per movie (`manage.py build_recommendations`)
+RECOMMENDATIONS_TOP_K = 8
+
+# 📜 Booking event feed (movies/events.py): reads stay this many seconds
+# behind now so late-committing transactions aren't skipped; batch cap.
+BOOKING_EVENTS_SETTLE_SECONDS = 2
+BOOKING_EVENTS_MAX_BATCH = 5000
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR , 'media')
 
+# Media serving (movies/media.py). Behind nginx set MEDIA_SENDFILE to
+# "x-accel-redirect" and add an internal location, e.g.
+#   location /protected-media/ { internal; alias /app/media/; }
+# ("x-sendfile" for Apache/mod_xsendfile).
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 86400  # browser cache lifetime of un-hashed uploads (hashed variants: a year)
+
 ROOT_URLCONF = "bookmyticket.urls"
 LOGIN_URL = '/login/'
 
+# Template sources, wrapped in the cached loader below outside DEBUG.
+# (Our own setting; Django's TEMPLATE_LOADERS was removed in 1.10.)
+TEMPLATE_SOURCE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],   # <-- IMPORTANT: keep empty
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates are kept in memory outside DEBUG (edits show
+            # up in development); the explicit list replaces APP_DIRS.
+            'loaders': TEMPLATE_SOURCE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', TEMPLATE_SOURCE_LOADERS),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -111,6 +190,58 @@ DATABASES = {
     ssl_require=True
   )
 }
+
+# Read replicas for catalog and reporting reads, e.g.
+#   DATABASE_REPLICA_URLS="postgres://...replica-1,postgres://...replica-2"
+# or, locally, "sqlite:///replica.sqlite3".  Routing lives in
+# booktheticket/routers.py.
+DATABASE_REPLICAS = []
+for number, url in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')), 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = dj_database_url.parse(url.strip(), conn_max_age=600)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+# Seat/booking shards, e.g. SEAT_SHARD_URLS="sqlite:///shard1.sqlite3,sqlite:///shard2.sqlite3".
+# "default" stays a shard so existing theaters keep working; move them with
+# `manage.py rebalance_shards`.
+SEAT_SHARDS = ['default']
+for number, url in enumerate(filter(None, os.environ.get('SEAT_SHARD_URLS', '').split(',')), 1):
+    alias = f'shard{number}'
+    DATABASES[alias] = dj_database_url.parse(url.strip(), conn_max_age=600)
+    SEAT_SHARDS.append(alias)
+
+# SQLite profile for single-box / edge venues without Postgres:
+#   DATABASE_PROFILE=sqlite            -> db.sqlite3 (or SQLITE_PATH)
+# Every sqlite database (including sqlite:// replica/shard URLs) runs in
+# WAL mode with BEGIN IMMEDIATE writes; see booktheticket/db/sqlite3.
+# Replicas are only read, so they keep plain BEGIN (an IMMEDIATE one would
+# also clash with the primary's lock when tests mirror it).
+# Measure with `manage.py benchmark_seat_holds --processes 4 --workers 1`.
+SQLITE_OPTIONS = {
+    'timeout': 20,                  # busy_timeout: queue for the write lock
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'transaction_mode': 'IMMEDIATE',
+}
+if os.environ.get('DATABASE_PROFILE') == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+    }
+for alias, config in DATABASES.items():
+    if config['ENGINE'] == 'django.db.backends.sqlite3':
+        config['ENGINE'] = 'booktheticket.db.sqlite3'
+        config['OPTIONS'] = {**SQLITE_OPTIONS, **config.get('OPTIONS', {})}
+        if alias in DATABASE_REPLICAS:
+            config['OPTIONS']['transaction_mode'] = 'DEFERRED'
+
+DATABASE_ROUTERS = [
+    'booktheticket.routers.SeatShardRouter',
+    'booktheticket.routers.PrimaryReplicaRouter',
+]
+REPLICA_PIN_SECONDS = 15  # read-your-writes window after a booking
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
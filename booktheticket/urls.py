@@ -1,8 +1,8 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from movies.views import movie_list
 from django.conf import settings
-from django.conf.urls.static import static
+from movies.media import serve_media
 from users.views import home
 
 urlpatterns = [
@@ -13,5 +13,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# 🖼 Posters: conditional GET, ranges and X-Accel-Redirect (see movies/media.py)
+urlpatterns += [
+    re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serve_media),
+]
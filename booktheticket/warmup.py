@@ -0,0 +1,75 @@
+"""
+Warm a freshly started process before it takes traffic.
+
+Called from gunicorn.conf.py: templates and URL patterns in the master
+(``preload_app``), so every forked worker inherits them compiled; the
+database connections in each worker after the fork, because a socket
+must never be shared between processes.  Anything that fails to warm is
+logged and left for the first request to do, as before.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TEMPLATES = [
+    "home.html",
+    "movies/movie_list.html",
+    "movies/theater_list.html",
+    "movies/seat_selection.html",
+    "movies/booking_email.html",
+]
+
+
+def _timed(label, fn, *args):
+    start = time.perf_counter()
+    try:
+        fn(*args)
+    except Exception:
+        logger.exception("Warm-up step %s failed", label)
+    return label, time.perf_counter() - start
+
+
+def warm_urls():
+    # Imports every view module and compiles the URL regexes.
+    get_resolver().url_patterns
+    get_resolver().reverse_dict
+
+
+def warm_templates():
+    # Compiles and, with the cached loader, keeps the templates.  One
+    # that fails doesn't stop the rest.
+    for name in getattr(settings, "WARMUP_TEMPLATES", WARMUP_TEMPLATES):
+        try:
+            get_template(name)
+        except Exception:
+            logger.exception("Could not warm template %s", name)
+
+
+def warm_database():
+    """Open (TLS handshake, auth) every configured connection and ping it."""
+    for alias in connections:
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except Exception:
+            logger.exception("Could not open database %s", alias)
+
+
+def warm_code():
+    """Everything that can be shared across forks; no sockets."""
+    return dict([_timed("urls", warm_urls), _timed("templates", warm_templates)])
+
+
+def warm_worker():
+    """Per-process state; call after forking."""
+    # Connections opened before the fork (there shouldn't be any) are unsafe.
+    connections.close_all()
+    return dict([_timed("database", warm_database)])
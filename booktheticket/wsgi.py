@@ -15,3 +15,11 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "bookmyticket.settings")
 
 application = get_wsgi_application()
 app = application
+
+# Serverless (Vercel sets VERCEL=1) has no gunicorn hooks: warm while the
+# function initialises instead of on its first request.
+if os.environ.get("VERCEL") or os.environ.get("WARMUP_ON_IMPORT") == "1":
+    from booktheticket.warmup import warm_code, warm_worker
+
+    warm_code()
+    warm_worker()
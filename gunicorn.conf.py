@@ -0,0 +1,93 @@
+"""
+Gunicorn profile: preloaded, warmed workers.
+
+    gunicorn -c gunicorn.conf.py booktheticket.wsgi
+
+* ``preload_app`` imports Django, the apps and their dependencies once in
+  the master; workers are forked with all of it already in memory.
+* ``when_ready`` (master) compiles the URL patterns and the hot
+  templates, so forks inherit them.
+* ``post_worker_init`` (each worker, after loading the app and before
+  accepting connections) opens its database connections.  Keep
+  ``CONN_MAX_AGE`` > 0 so the warmed connection is the one requests
+  reuse; with ``--threads`` each thread still opens its own.
+
+Set ``GUNICORN_WARMUP=0`` to turn the warm-up off, e.g. to compare with
+``manage.py benchmark_cold_start --gunicorn``.
+
+With more than one worker the waiting room needs a shared cache
+(``MEMCACHED_LOCATION``).  Without one, ``workers`` defaults to 1, and
+``on_starting`` drops back to one worker (with a warning) if more were
+asked for.
+
+``DJANGO_DEBUG`` defaults to on for ``runserver``; here it defaults to
+off, since the cached template loader only runs with DEBUG off.
+``on_starting`` warns if it was turned back on.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# One worker unless the waiting room's queue can be shared between them
+workers = int(os.environ.get(
+    "WEB_CONCURRENCY",
+    multiprocessing.cpu_count() * 2 + 1 if os.environ.get("MEMCACHED_LOCATION") else 1,
+))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+timeout = 30
+graceful_timeout = 30
+# Recycle workers now and then, staggered so they don't all go cold at once
+max_requests = 2000
+max_requests_jitter = 200
+
+WARMUP = os.environ.get("GUNICORN_WARMUP", "1") != "0"
+
+# Before Django reads its settings (preloaded or not)
+os.environ.setdefault("DJANGO_DEBUG", "0")
+
+
+def _describe(timings):
+    return ", ".join(f"{step} in {seconds * 1000:.0f}ms" for step, seconds in timings.items())
+
+
+def on_starting(server):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "booktheticket.settings")
+    from django.conf import settings
+
+    if settings.DEBUG:
+        server.log.warning(
+            "DEBUG is on (DJANGO_DEBUG=%s): templates are recompiled on every "
+            "request and error pages show settings; set DJANGO_DEBUG=0",
+            os.environ.get("DJANGO_DEBUG"),
+        )
+
+    backend = settings.CACHES["default"]["BACKEND"]
+    per_process = backend.endswith((".LocMemCache", ".DummyCache"))
+    if server.cfg.workers > 1 and per_process and getattr(settings, "WAITING_ROOM_ENABLED", True):
+        # Each worker would run its own queue and admit its own 50.
+        server.log.warning(
+            "The waiting room needs a cache shared by all %d workers, not %s; "
+            "running one worker. Set MEMCACHED_LOCATION to run more.",
+            server.cfg.workers, backend.rsplit(".", 1)[-1],
+        )
+        server.cfg.set("workers", 1)
+        server.num_workers = 1
+
+
+def when_ready(server):
+    # Only the preloaded master has Django loaded.
+    if not (WARMUP and server.cfg.preload_app):
+        return
+    from booktheticket.warmup import warm_code
+
+    server.log.info("Warmed %s", _describe(warm_code()))
+
+
+def post_worker_init(worker):
+    if not WARMUP:
+        return
+    from booktheticket.warmup import warm_code, warm_worker
+
+    timings = {} if worker.cfg.preload_app else warm_code()
+    timings.update(warm_worker())
+    worker.log.info("Worker %s warmed %s", worker.pid, _describe(timings))
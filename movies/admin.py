@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Movie, Theater, Seat, Booking
+from .models import Movie, Theater, Seat, Booking, BookingHistory, ShowPrice
 
 
 @admin.register(Movie)
@@ -20,16 +20,36 @@ class MovieAdmin(admin.ModelAdmin):
     )
 
 
+class ShowPriceInline(admin.TabularInline):
+    model = ShowPrice
+    extra = 0
+
+
 @admin.register(Theater)
 class TheaterAdmin(admin.ModelAdmin):
-    list_display = ('name', 'movie', 'time')
+    list_display = ('name', 'movie', 'date', 'time')
+    list_filter = ('date',)
+    inlines = [ShowPriceInline]
 
 
 @admin.register(Seat)
 class SeatAdmin(admin.ModelAdmin):
-    list_display = ('seat_number', 'theater', 'is_booked')
+    list_display = ('seat_number', 'theater', 'category', 'is_booked')
+    list_filter = ('category',)
 
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
-    list_display = ('user', 'movie', 'theater', 'seat', 'booked_at')
+    list_display = ('user', 'movie', 'theater', 'seat', 'amount', 'booked_at')
+
+
+@admin.register(BookingHistory)
+class BookingHistoryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'movie', 'theater', 'seat_number', 'amount', 'booked_at')
+
+    # Append-only: written by `manage.py archive_past_shows`
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,146 @@
+"""
+Best-available seat allocation.
+
+Seat numbers are read as ``<row letters><seat number>`` ("A1", "B12",
+"AA3").  Each row becomes an integer bitmap with bit ``k`` standing for
+seat ``k``, set when the seat is free, so finding every run of ``n`` free
+seats in a row is ``n - 1`` shifts and ANDs.  Among all runs we pick the
+one closest to the centre of the auditorium and hold it in one step.
+
+``manage.py benchmark_allocator`` times it on a 500-seat show.
+"""
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from django.utils import timezone
+
+from .holds import HoldResult, hold_seats
+
+MAX_GROUP_SIZE = 10
+SEAT_NUMBER_RE = re.compile(r"^\s*([A-Za-z]+)\s*-?\s*(\d+)\s*$")
+
+# How much one row away from the middle row costs, in seat widths.
+ROW_WEIGHT = 1.5
+
+
+@dataclass
+class Row:
+    label: str
+    free: int = 0
+    seats: int = 0  # every seat, free or not
+    seat_ids: dict = field(default_factory=dict)
+
+    def add(self, position, seat_id, is_free):
+        bit = 1 << position
+        self.seat_ids[position] = seat_id
+        self.seats |= bit
+        if is_free:
+            self.free |= bit
+
+    @property
+    def first(self):
+        return (self.seats & -self.seats).bit_length() - 1
+
+    @property
+    def last(self):
+        return self.seats.bit_length() - 1
+
+    @property
+    def centre(self):
+        return (self.first + self.last) / 2
+
+
+def row_sort_key(label):
+    # A, B, ..., Z, AA, AB, ...
+    return len(label), label
+
+
+@lru_cache(maxsize=4096)
+def parse_seat_number(seat_number):
+    """``"b12"`` -> ``("B", 12)``, or ``None``.  Every show reuses the same labels."""
+    match = SEAT_NUMBER_RE.match(seat_number)
+    if not match:
+        return None
+    return match.group(1).upper(), int(match.group(2))
+
+
+def load_rows(theater, user=None, now=None):
+    """Build the per-row availability bitmaps for a theater in one query."""
+    now = now or timezone.now()
+    rows = {}
+    seats = theater.seats.values_list(
+        "id", "seat_number", "is_booked", "reserved_by_id", "reserved_until"
+    )
+
+    for seat_id, seat_number, is_booked, reserved_by_id, reserved_until in seats:
+        parsed = parse_seat_number(seat_number)
+        if parsed is None:
+            continue
+
+        # The seat number is the bit position, so "A0" is fine too.
+        label, number = parsed
+        held_by_other = (
+            reserved_until is not None
+            and reserved_until > now
+            and (user is None or reserved_by_id != user.id)
+        )
+        rows.setdefault(label, Row(label)).add(
+            number, seat_id, not is_booked and not held_by_other
+        )
+
+    return [rows[label] for label in sorted(rows, key=row_sort_key)]
+
+
+def runs_of(free, count):
+    """Bitmap of start positions of ``count`` consecutive free seats."""
+    starts = free
+    for offset in range(1, count):
+        starts &= free >> offset
+    return starts
+
+
+def find_best(rows, count):
+    """Return the seat ids of the best block of ``count`` seats, or ``[]``."""
+    if not rows:
+        return []
+
+    middle_row = (len(rows) - 1) / 2
+    best_score, best_ids = None, []
+
+    for index, row in enumerate(rows):
+        starts = runs_of(row.free, count)
+        row_cost = abs(index - middle_row) * ROW_WEIGHT
+        centre = row.centre
+
+        while starts:
+            lowest = starts & -starts
+            start = lowest.bit_length() - 1
+            starts ^= lowest
+
+            score = row_cost + abs(start + (count - 1) / 2 - centre)
+            if best_score is None or score < best_score:
+                best_score = score
+                best_ids = [row.seat_ids[p] for p in range(start, start + count)]
+
+    return best_ids
+
+
+def allocate_best(theater, user, count, attempts=3):
+    """
+    Find and hold the best ``count`` seats together.
+
+    If somebody grabs part of the block between the scan and the hold,
+    rescan and try again a couple of times.
+    """
+    result = HoldResult()
+    for _ in range(attempts):
+        seat_ids = find_best(load_rows(theater, user), count)
+        if not seat_ids:
+            break
+
+        result = hold_seats(theater, user, seat_ids)
+        if result.ok:
+            break
+
+    return result
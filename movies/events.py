@@ -0,0 +1,120 @@
+"""
+Append-only feed of seat holds, bookings and releases.
+
+``holds.py`` writes a ``BookingEvent`` per seat in the same transaction
+as the seat change, on the show's shard, so the feed never shows a hold
+that was rolled back or misses one that committed.  Rows are never
+updated or deleted.
+
+Consumers (``/movies/events/`` and ``manage.py tail_booking_events``)
+read forward from a cursor: the last event id they have seen on each
+shard, e.g. ``default:1200,shard1:87``.  Ids are only ordered within a
+shard; an event moved shard with its theater stays where it was written.
+
+Ids are handed out at INSERT, not at COMMIT, so on Postgres a slow
+transaction can commit id 10 after id 11 has been read.  Reads therefore
+stop ``BOOKING_EVENTS_SETTLE_SECONDS`` short of now, which covers any
+hold/book/release transaction in this app (SQLite serialises writers, so
+the problem doesn't arise there).  A batch ends at the first event that
+hasn't settled, never skipping past it: ``created_at`` comes from each
+web process's clock, so a later id can carry an earlier time.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .shards import fan_out, shard_aliases, shard_of
+
+
+def settle_lag():
+    return timedelta(seconds=getattr(settings, "BOOKING_EVENTS_SETTLE_SECONDS", 2))
+
+
+def max_batch():
+    return getattr(settings, "BOOKING_EVENTS_MAX_BATCH", 5000)
+
+
+# =========================
+# WRITING (inside the caller's transaction)
+# =========================
+def record(theater, kind, seats, user_id=None, amounts=None, booking_ids=None):
+    """One ``kind`` event per seat of ``theater``."""
+    from .models import BookingEvent
+
+    amounts = amounts or {}
+    booking_ids = booking_ids or {}
+    now = timezone.now()
+    BookingEvent.objects.using(shard_of(theater)).bulk_create([
+        BookingEvent(
+            kind=kind,
+            theater_id=theater.id,
+            movie_id=theater.movie_id,
+            seat_id=seat.id,
+            seat_number=seat.seat_number,
+            user_id=user_id if user_id is not None else seat.reserved_by_id,
+            amount=amounts.get(seat.id),
+            booking_id=booking_ids.get(seat.id),
+            created_at=now,
+        )
+        for seat in seats
+    ])
+
+
+# =========================
+# READING
+# =========================
+class InvalidCursor(ValueError):
+    pass
+
+
+def decode_cursor(cursor):
+    """``"default:12,shard1:7"`` -> ``{"default": 12, "shard1": 7}``."""
+    positions = {}
+    for part in filter(None, (cursor or "").split(",")):
+        alias, _, last_id = part.rpartition(":")
+        if alias not in shard_aliases() or not last_id.isdigit():
+            raise InvalidCursor(f"bad cursor position {part!r}")
+        positions[alias] = int(last_id)
+    return positions
+
+
+def encode_cursor(positions):
+    return ",".join(f"{alias}:{positions[alias]}" for alias in sorted(positions))
+
+
+def read_events(cursor=None, limit=1000):
+    """
+    Events after ``cursor`` that have settled, at most ``limit`` per
+    shard, oldest first.  Returns ``(events, next_cursor, more)``; pass
+    ``next_cursor`` back unchanged to continue.  ``more`` means a shard
+    filled its batch with settled events and may have others waiting.
+    """
+    from .models import BookingEvent
+
+    positions = decode_cursor(cursor)
+    limit = max(1, min(limit, max_batch()))
+    settled = timezone.now() - settle_lag()
+
+    def batch(alias):
+        # Primary key range scan, cut at the first unsettled event.
+        rows = list(
+            BookingEvent.objects.using(alias)
+            .filter(id__gt=positions.get(alias, 0))
+            .order_by("id")[:limit]
+        )
+        for n, row in enumerate(rows):
+            if row.created_at > settled:
+                return rows[:n], False
+        return rows, len(rows) == limit
+
+    aliases = shard_aliases()
+    events, more = [], False
+    for alias, (rows, full) in zip(aliases, fan_out(batch, aliases)):
+        if rows:
+            positions[alias] = rows[-1].id
+        more = more or full
+        events.extend(rows)
+
+    events.sort(key=lambda event: (event.created_at, event._state.db, event.id))
+    return events, encode_cursor(positions), more
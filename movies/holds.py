@@ -0,0 +1,223 @@
+"""
+Seat holds and bookings.
+
+Two ways of taking a hold, selected with ``settings.SEAT_LOCKING``:
+
+* ``"pessimistic"`` locks the requested rows with ``SELECT ... FOR UPDATE``
+  and checks them while everybody else clicking the same seats waits.
+* ``"optimistic"`` takes no locks.  Every write is a conditional
+  ``UPDATE`` on the seat's ``version`` (the one the client last saw, when
+  it sent one) and its availability, and the affected-row count tells us
+  exactly which seats were lost to somebody else.
+
+Either way a hold is all-or-nothing: if any seat is lost nothing is
+held, and the caller gets the lost seats back so the user only has to
+re-pick those.
+"""
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .events import record
+from .models import BookingEvent, Seat, Theater
+from .pricing import price_table, seat_price
+from .shards import shard_aliases, shard_of
+
+HOLD_DURATION = timedelta(minutes=5)
+
+
+@dataclass
+class HoldResult:
+    held: list = field(default_factory=list)
+    lost: list = field(default_factory=list)
+    reserved_until: object = None
+
+    @property
+    def ok(self):
+        return bool(self.held) and not self.lost
+
+
+def locking_mode(mode=None):
+    return mode or getattr(settings, "SEAT_LOCKING", "pessimistic")
+
+
+def _available_to(user, now):
+    """Seats that are not booked and not held by somebody else."""
+    return Q(is_booked=False) & (
+        Q(reserved_until__isnull=True)
+        | Q(reserved_until__lte=now)
+        | Q(reserved_by=user)
+    )
+
+
+def hold_seats(theater, user, seat_ids, versions=None, mode=None, record_events=True):
+    """
+    Hold ``seat_ids`` for ``user`` for ``HOLD_DURATION``.
+
+    ``versions`` maps seat id -> the version the client rendered; seats
+    without one are only checked for availability.  ``record_events=False``
+    keeps the hold out of the event feed (benchmarks' throwaway shows).
+    """
+    seat_ids = [int(seat_id) for seat_id in seat_ids]
+    versions = {int(k): int(v) for k, v in (versions or {}).items()}
+    now = timezone.now()
+    reserved_until = now + HOLD_DURATION
+
+    if locking_mode(mode) == "optimistic":
+        lost = _hold_optimistic(theater, user, seat_ids, versions, now, reserved_until, record_events)
+    else:
+        lost = _hold_pessimistic(theater, user, seat_ids, versions, now, reserved_until, record_events)
+
+    if lost:
+        return HoldResult(lost=lost)
+    return HoldResult(held=seat_ids, reserved_until=reserved_until)
+
+
+def _hold_pessimistic(theater, user, seat_ids, versions, now, reserved_until, record_events):
+    with transaction.atomic(using=shard_of(theater)):
+        seats = {
+            seat.id: seat
+            for seat in theater.seats.select_for_update().filter(id__in=seat_ids)
+        }
+
+        lost = [
+            seat_id for seat_id in seat_ids
+            if seat_id not in seats
+            or seats[seat_id].is_booked
+            or (seats[seat_id].is_reserved() and seats[seat_id].reserved_by_id != user.id)
+            or versions.get(seat_id, seats[seat_id].version) != seats[seat_id].version
+        ]
+        if lost:
+            return lost
+
+        theater.seats.filter(id__in=seat_ids).update(
+            reserved_by=user,
+            reserved_until=reserved_until,
+            version=F("version") + 1,
+        )
+        if record_events:
+            record(theater, BookingEvent.HOLD, [seats[seat_id] for seat_id in seat_ids], user_id=user.id)
+    return []
+
+
+def _hold_optimistic(theater, user, seat_ids, versions, now, reserved_until, record_events):
+    lost = []
+    with transaction.atomic(using=shard_of(theater)):
+        for seat_id in seat_ids:
+            seats = theater.seats.filter(_available_to(user, now), id=seat_id)
+            if seat_id in versions:
+                seats = seats.filter(version=versions[seat_id])
+
+            updated = seats.update(
+                reserved_by=user,
+                reserved_until=reserved_until,
+                version=F("version") + 1,
+            )
+            if not updated:
+                lost.append(seat_id)
+
+        if lost:
+            transaction.set_rollback(True, using=shard_of(theater))
+        elif record_events:
+            held = theater.seats.filter(id__in=seat_ids).only("id", "theater_id", "seat_number")
+            record(theater, BookingEvent.HOLD, held, user_id=user.id)
+    return lost
+
+
+def book_held_seats(theater, user, seat_ids, mode=None):
+    """
+    Turn the user's still-valid holds into bookings.
+
+    Returns the booked seats, each with the ``price`` it was charged;
+    holds that expired (or were taken over) in the meantime are skipped.
+    """
+    now = timezone.now()
+    optimistic = locking_mode(mode) == "optimistic"
+    prices = price_table(theater)  # one lookup for the whole checkout
+
+    with transaction.atomic(using=shard_of(theater)):
+        seats = theater.seats.filter(
+            id__in=seat_ids,
+            is_booked=False,
+            reserved_by=user,
+            reserved_until__gt=now,
+        )
+        if not optimistic:
+            seats = seats.select_for_update()
+
+        booked, booking_ids = [], {}
+        for seat in seats:
+            updated = theater.seats.filter(id=seat.id, version=seat.version).update(
+                is_booked=True,
+                reserved_by=None,
+                reserved_until=None,
+                version=F("version") + 1,
+            )
+            if not updated:
+                continue
+
+            seat.price = seat_price(prices, seat.category)
+            booking = theater.booking_set.create(
+                user=user,
+                seat=seat,
+                movie=theater.movie,
+                amount=seat.price,
+            )
+            booked.append(seat)
+            booking_ids[seat.id] = booking.id
+
+        record(
+            theater,
+            BookingEvent.BOOK,
+            booked,
+            user_id=user.id,
+            amounts={seat.id: seat.price for seat in booked},
+            booking_ids=booking_ids,
+        )
+
+    return booked
+
+
+def release_expired(theater=None):
+    """
+    Clear lapsed holds (per shard, when no theater is given) and log a
+    release event for each; returns how many were released.
+    """
+    now = timezone.now()
+    if theater is not None:
+        querysets = [(shard_of(theater), theater.seats.all())]
+    else:
+        querysets = [(alias, Seat.objects.using(alias)) for alias in shard_aliases()]
+
+    released = 0
+    for alias, seats in querysets:
+        expired = seats.filter(reserved_until__lte=now, reserved_by__isnull=False)
+        # Nearly always nothing: don't open a write transaction for that.
+        if not expired.exists():
+            continue
+
+        with transaction.atomic(using=alias):
+            lapsed = list(
+                expired.select_for_update().only("id", "theater_id", "seat_number", "reserved_by_id")
+            )
+            seats.filter(id__in=[seat.id for seat in lapsed]).update(
+                reserved_by=None,
+                reserved_until=None,
+                version=F("version") + 1,
+            )
+
+            by_theater = {}
+            for seat in lapsed:
+                by_theater.setdefault(seat.theater_id, []).append(seat)
+            shows = {theater.id: theater} if theater is not None else Theater.objects.in_bulk(by_theater)
+            for theater_id, theater_seats in by_theater.items():
+                if theater_id in shows:  # else orphaned seats of a deleted show
+                    # reserved_by_id is still the lapsed holder on these objects
+                    record(shows[theater_id], BookingEvent.RELEASE, theater_seats)
+
+        released += len(lapsed)
+    return released
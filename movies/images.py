@@ -0,0 +1,90 @@
+"""
+Responsive poster variants.
+
+Every ``Movie.image`` is resized to a few widths and encoded as both
+JPEG and WebP.  Variant file names carry a hash of their own bytes
+(``movies/variants/kaantha.320w.3f2a9c1d0b7e.webp``), so a URL never
+changes meaning and can be cached forever.  The names are kept on the
+movie in ``image_variants``, so rendering a card never touches the disk.
+
+``render_variants`` is pure Pillow work on bytes, which is what the
+backfill command farms out to worker processes.
+"""
+import hashlib
+import logging
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = "movies/variants"
+VARIANT_WIDTHS = getattr(settings, "POSTER_WIDTHS", (160, 320, 640))
+
+# format -> (Pillow format, extension, save options)
+FORMATS = {
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 6}),
+}
+
+
+def render_variants(data, widths=VARIANT_WIDTHS):
+    """
+    Resize image ``data`` to each width (never upscaling) and encode it
+    in every format.  Returns ``[(format, width, bytes), ...]``.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original).convert("RGB")
+
+    rendered = []
+    for width in sorted({min(w, image.width) for w in widths}):
+        height = round(image.height * width / image.width)
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+
+        for fmt, (pil_format, _, options) in FORMATS.items():
+            out = BytesIO()
+            resized.save(out, pil_format, **options)
+            rendered.append((fmt, width, out.getvalue()))
+
+    return rendered
+
+
+def variant_name(source_name, fmt, width, content):
+    digest = hashlib.md5(content).hexdigest()[:12]
+    stem = PurePosixPath(source_name).stem
+    return f"{VARIANT_DIR}/{stem}.{width}w.{digest}.{FORMATS[fmt][1]}"
+
+
+def store_variants(source_name, rendered, storage=default_storage):
+    """Save rendered variants (skipping ones already stored) and return the manifest."""
+    manifest = {"source": source_name}
+    for fmt, width, content in rendered:
+        name = variant_name(source_name, fmt, width, content)
+        if not storage.exists(name):
+            name = storage.save(name, ContentFile(content))
+        manifest.setdefault(fmt, {})[str(width)] = name
+    return manifest
+
+
+def build_variants(image_field):
+    """Render and store variants for an ImageField file; ``{}`` if unreadable."""
+    try:
+        image_field.open("rb")
+        with image_field:
+            data = image_field.read()
+        return store_variants(image_field.name, render_variants(data))
+    except Exception:
+        logger.exception("Could not build poster variants for %s", image_field.name)
+        return {}
+
+
+def srcset(manifest, fmt):
+    return ", ".join(
+        f"{default_storage.url(name)} {width}w"
+        for width, name in sorted(manifest.get(fmt, {}).items(), key=lambda item: int(item[0]))
+    )
@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from movies.models import BookingHistory, Theater
+from movies.shards import shard_of
+
+
+class Command(BaseCommand):
+    help = (
+        'Move bookings of shows that ended more than --days ago into '
+        'BookingHistory and delete their seats, in batches. Shows without '
+        'a date are never archived. Safe to re-run after an interruption.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Archive shows older than this')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only list the shows')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.localdate() - timedelta(days=options['days'])
+        theaters = Theater.objects.filter(date__lt=cutoff).select_related('movie').order_by('date', 'id')
+
+        archived = shows = 0
+        for theater in theaters.iterator():
+            if not theater.seats.exists():
+                continue  # already archived
+
+            shows += 1
+            self.stdout.write(f'{theater.date} {theater.id} {theater.name} ({theater.movie.name})')
+            if not options['dry_run']:
+                archived += self.archive(theater, options['batch_size'])
+
+        if options['dry_run']:
+            self.stdout.write(f'{shows} shows to archive (before {cutoff})')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Successfully archived {archived} bookings from {shows} shows'
+            ))
+
+    def archive(self, theater, batch_size):
+        shard = shard_of(theater)
+        archived = 0
+
+        # 1. Bookings -> history. History is written (and committed) before
+        # the live rows go; the unique (theater, seat_number) constraint
+        # makes a retry after a crash in between harmless.
+        while True:
+            with transaction.atomic(using=shard):
+                batch = list(
+                    theater.booking_set.select_related('seat').order_by('id')[:batch_size]
+                )
+                if not batch:
+                    break
+
+                BookingHistory.objects.bulk_create(
+                    [
+                        BookingHistory(
+                            user_id=booking.user_id,
+                            movie_id=booking.movie_id,
+                            theater_id=theater.id,
+                            seat_number=booking.seat_number,
+                            booked_at=booking.booked_at,
+                            amount=booking.amount,
+                        )
+                        for booking in batch
+                    ],
+                    ignore_conflicts=True,
+                )
+                theater.booking_set.filter(id__in=[b.id for b in batch]).delete()
+                archived += len(batch)
+
+        # 2. Seats, a batch per transaction to keep write locks short.
+        while True:
+            with transaction.atomic(using=shard):
+                ids = list(theater.seats.values_list('id', flat=True)[:batch_size])
+                if not ids:
+                    break
+                theater.seats.filter(id__in=ids).delete()
+
+        return archived
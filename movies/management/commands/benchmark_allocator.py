@@ -0,0 +1,106 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import time as showtime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from movies.allocator import allocate_best, find_best, load_rows
+from movies.models import Movie, Seat, Theater
+from movies.shards import choose_shard
+
+
+class Command(BaseCommand):
+    help = (
+        'Time best-available allocation (load_rows, find_best, and the whole '
+        'allocate_best including the hold) on a throwaway show, rolled back afterwards'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20)
+        parser.add_argument('--per-row', type=int, default=25, help='Seats per row (default: 500 seats)')
+        parser.add_argument('--taken', type=float, default=0.5, help='Share of seats already booked')
+        parser.add_argument('--group', type=int, default=4, help='Seats per allocation')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument(
+            '--budget-ms', type=float, default=10.0,
+            help='Fail if the median allocate_best takes longer than this',
+        )
+
+    def handle(self, *args, **options):
+        if options['rows'] > 26:
+            raise CommandError('At most 26 rows (A-Z)')
+
+        # The show, its user, the holds and their feed events are all
+        # rolled back afterwards: nothing is left in the database and
+        # event consumers never see the benchmark.  allocate_best's own
+        # transaction becomes a savepoint, so commits aren't timed.
+        shard = choose_shard()
+        with transaction.atomic():
+            with transaction.atomic(using=shard):
+                timings = self.benchmark(shard, options)
+                transaction.set_rollback(True, using=shard)
+            transaction.set_rollback(True)
+
+        seats = options['rows'] * options['per_row']
+        self.stdout.write(f'{seats} seats, {options["taken"]:.0%} taken, groups of {options["group"]}:')
+        for label, values in timings.items():
+            values.sort()
+            self.stdout.write(
+                f'  {label:<15}{statistics.median(values) * 1000:8.2f} ms'
+                f'  (p95 {values[int(len(values) * 0.95)] * 1000:.2f})'
+            )
+
+        median = statistics.median(timings['allocate_best']) * 1000
+        if median > options['budget_ms']:
+            raise CommandError(f'allocate_best took {median:.2f} ms, over the {options["budget_ms"]:g} ms budget')
+
+    def benchmark(self, shard, options):
+        rng = random.Random(0)
+        run = uuid.uuid4().hex[:8]  # clear of real rows' unique names
+        movie = Movie.objects.create(
+            name=f'Benchmark {run}', rating=0, cast='', description='',
+            genre='Action', language='English',
+        )
+        theater = Theater.objects.create(name='Benchmark', movie=movie, time=showtime(18, 0), shard=shard)
+        theater.seats.bulk_create([
+            Seat(
+                theater=theater,
+                seat_number=f'{chr(ord("A") + row)}{number}',
+                time=theater.time,
+                is_booked=rng.random() < options['taken'],
+            )
+            for row in range(options['rows'])
+            for number in range(1, options['per_row'] + 1)
+        ])
+        user = User.objects.create(username=f'benchmark-allocator-{run}')
+
+        rows = load_rows(theater, user)
+        return {
+            'load_rows': self.time(lambda: load_rows(theater, user), options['iterations']),
+            'find_best': self.time(lambda: find_best(rows, options['group']), options['iterations']),
+            'allocate_best': self.time(
+                lambda: self.allocate(theater, user, options['group']), options['iterations'],
+                # Give the seats back for the next round, off the clock
+                reset=lambda: theater.seats.filter(reserved_by=user).update(
+                    reserved_by=None, reserved_until=None
+                ),
+            ),
+        }
+
+    def allocate(self, theater, user, group):
+        if not allocate_best(theater, user, group).ok:
+            raise CommandError('No block found; lower --taken or --group')
+
+    def time(self, fn, iterations, reset=None):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+            if reset:
+                reset()
+        return timings
@@ -0,0 +1,168 @@
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a brand-new interpreter: everything a cold worker pays for.
+PROBE = r'''
+import json, os, sys, time
+start = time.perf_counter()
+
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+loaded = time.perf_counter()
+
+if os.environ["COLD_START_WARM"] == "1":
+    from booktheticket.warmup import warm_code, warm_worker
+    warm_code()
+    warm_worker()
+warmed = time.perf_counter()
+
+from django.test import Client
+client = Client(HTTP_HOST="localhost")
+latencies = []
+for _ in range(2):
+    t = time.perf_counter()
+    status = client.get(sys.argv[1]).status_code
+    latencies.append(time.perf_counter() - t)
+
+print(json.dumps({
+    "status": status,
+    "load": loaded - start,
+    "warm": warmed - loaded,
+    "first": latencies[0],
+    "second": latencies[1],
+    "ready_to_first_byte": warmed - start + latencies[0],
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure cold start and first-request latency of a fresh process, '
+        'with and without the warm-up in booktheticket/warmup.py'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/movies/', help='Page to request')
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument(
+            '--gunicorn', action='store_true',
+            help='Start real gunicorn (gunicorn.conf.py, one worker) instead of a bare process',
+        )
+        parser.add_argument(
+            '--settle', type=float, default=3.0,
+            help='With --gunicorn: seconds to let the worker boot before the first request',
+        )
+
+    def handle(self, *args, **options):
+        if options['gunicorn']:
+            def measure(path, warm):
+                return self.gunicorn_run(path, warm, options['settle'])
+        else:
+            measure = self.process_run
+
+        for warm in (False, True):
+            runs = [measure(options['path'], warm) for _ in range(options['runs'])]
+            self.report('warm' if warm else 'cold', runs)
+
+    # =========================
+    # MEASUREMENTS
+    # =========================
+    def environment(self, warm):
+        env = dict(os.environ)
+        env['DJANGO_SETTINGS_MODULE'] = settings.SETTINGS_MODULE
+        env['COLD_START_WARM'] = '1' if warm else '0'
+        env['GUNICORN_WARMUP'] = '1' if warm else '0'
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(settings.BASE_DIR), env.get('PYTHONPATH')]))
+        return env
+
+    def process_run(self, path, warm):
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, path],
+            env=self.environment(warm), cwd=settings.BASE_DIR,
+            capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def gunicorn_run(self, path, warm, settle):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+
+        url = f'http://127.0.0.1:{port}{path}'
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                '--workers', '1', '--bind', f'127.0.0.1:{port}',
+                'booktheticket.wsgi:application',
+            ],
+            env=self.environment(warm), cwd=settings.BASE_DIR,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            while True:
+                if server.poll() is not None:
+                    raise CommandError('gunicorn exited; run it by hand to see why')
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                    break
+                except OSError:
+                    time.sleep(0.01)
+            listening = time.perf_counter()
+
+            # The master accepts before the worker has booted; give it time
+            # so only the lazy first-request work is measured, as after a
+            # max_requests recycle.
+            time.sleep(settle)
+            latencies = []
+            for _ in range(2):
+                t = time.perf_counter()
+                status = self.fetch(url)
+                latencies.append(time.perf_counter() - t)
+        finally:
+            server.terminate()
+            server.wait()
+
+        return {
+            'status': status,
+            'listen': listening - start,
+            'first': latencies[0],
+            'second': latencies[1],
+        }
+
+    @staticmethod
+    def fetch(url):
+        request = urllib.request.Request(url, headers={'Host': 'localhost'})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def report(self, label, runs):
+        self.stdout.write(self.style.SUCCESS(f'{label} (HTTP {runs[-1]["status"]}, median of {len(runs)}):'))
+        rows = [
+            ('import + setup', 'load'),
+            ('gunicorn listening', 'listen'),
+            ('warm-up', 'warm'),
+            ('first request', 'first'),
+            ('second request', 'second'),
+            ('start -> first response', 'ready_to_first_byte'),
+        ]
+        for title, key in rows:
+            if key in runs[0]:
+                median = statistics.median(run[key] for run in runs)
+                self.stdout.write(f'  {title:<26}{median * 1000:8.1f} ms')
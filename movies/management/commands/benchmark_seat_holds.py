@@ -0,0 +1,164 @@
+import multiprocessing
+import random
+import statistics
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import time as showtime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections
+from django.db.models import F
+
+from movies.holds import hold_seats
+from movies.models import Movie, Seat, Theater
+from movies.shards import shard_of
+
+
+def empty_stats():
+    return {'held': 0, 'conflicts': 0, 'lost_seats': 0, 'errors': 0, 'locked': 0, 'latencies': []}
+
+
+def merge(results):
+    merged = empty_stats()
+    for result in results:
+        for key, value in result.items():
+            merged[key] += value
+    return merged
+
+
+def client(mode, theater, user, hot_ids, group, deadline):
+    stats = empty_stats()
+    rng = random.Random(user.id)
+
+    try:
+        while time.monotonic() < deadline:
+            picks = rng.sample(hot_ids, group)
+            # The versions this client's seat map was rendered with
+            versions = dict(theater.seats.filter(id__in=picks).values_list('id', 'version'))
+
+            start = time.perf_counter()
+            try:
+                # A throwaway show: keep it out of the booking event feed
+                result = hold_seats(theater, user, picks, versions, mode=mode, record_events=False)
+            except DatabaseError as e:
+                stats['errors'] += 1
+                if 'locked' in str(e):
+                    stats['locked'] += 1
+                continue
+            stats['latencies'].append(time.perf_counter() - start)
+
+            if result.ok:
+                stats['held'] += 1
+                # Abandon the checkout straight away to keep the seats contended
+                theater.seats.filter(id__in=picks, reserved_by=user).update(
+                    reserved_by=None, reserved_until=None, version=F('version') + 1
+                )
+            else:
+                stats['conflicts'] += 1
+                stats['lost_seats'] += len(result.lost)
+    finally:
+        connections.close_all()
+
+    return stats
+
+
+def run_clients(mode, theater, users, hot_ids, group, deadline):
+    """One thread per user; also the entry point of each worker process."""
+    with ThreadPoolExecutor(max_workers=len(users)) as pool:
+        futures = [
+            pool.submit(client, mode, theater, user, hot_ids, group, deadline)
+            for user in users
+        ]
+        return merge([f.result() for f in futures])
+
+
+class Command(BaseCommand):
+    help = 'Benchmark pessimistic vs optimistic seat holds under contention'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=['both', 'pessimistic', 'optimistic'], default='both')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent clients (per process)')
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Worker processes, like gunicorn -w; try --processes 4 --workers 1',
+        )
+        parser.add_argument('--seconds', type=float, default=5, help='Duration per mode')
+        parser.add_argument('--seats', type=int, default=100, help='Seats in the show')
+        parser.add_argument('--hot', type=int, default=10, help='Seats everybody fights over')
+        parser.add_argument('--group', type=int, default=2, help='Seats per hold')
+
+    def handle(self, *args, **options):
+        modes = ['pessimistic', 'optimistic'] if options['mode'] == 'both' else [options['mode']]
+
+        run = uuid.uuid4().hex[:8]
+        movie = Movie.objects.create(
+            name=f'Benchmark {run}', rating=0, cast='', description='',
+            genre='Action', language='English',
+        )
+        theater = Theater.objects.create(name='Benchmark', movie=movie, time=showtime(18, 0))
+        theater.seats.bulk_create([
+            Seat(theater=theater, seat_number=f'B{n}', time=theater.time)
+            for n in range(1, options['seats'] + 1)
+        ])
+        users = [
+            User.objects.create(username=f'benchmark-holds-{run}-{n}')
+            for n in range(options['workers'] * options['processes'])
+        ]
+        hot_ids = list(
+            theater.seats.order_by('id').values_list('id', flat=True)
+        )[:options['hot']]
+
+        self.describe(theater, options)
+        try:
+            for mode in modes:
+                theater.seats.update(reserved_by=None, reserved_until=None)
+                self.report(mode, self.run(mode, theater, users, hot_ids, options), options)
+        finally:
+            movie.delete()
+            User.objects.filter(id__in=[u.id for u in users]).delete()
+
+    def run(self, mode, theater, users, hot_ids, options):
+        deadline = time.monotonic() + options['seconds']
+        group = options['group']
+
+        if options['processes'] == 1:
+            return run_clients(mode, theater, users, hot_ids, group, deadline)
+
+        # One process per gunicorn-style worker, each with its own connections.
+        connections.close_all()
+        chunks = [users[i::options['processes']] for i in range(options['processes'])]
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=len(chunks), mp_context=context) as pool:
+            futures = [
+                pool.submit(run_clients, mode, theater, chunk, hot_ids, group, deadline)
+                for chunk in chunks
+            ]
+            return merge([f.result() for f in futures])
+
+    def describe(self, theater, options):
+        connection = connections[shard_of(theater)]
+        line = f'{connection.vendor} ({connection.alias}), {options["processes"]} x {options["workers"]} clients'
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal = cursor.fetchone()[0]
+                cursor.execute('PRAGMA busy_timeout')
+                busy = cursor.fetchone()[0]
+            begin = getattr(connection, 'transaction_mode', 'DEFERRED')
+            line += f': journal_mode={journal}, busy_timeout={busy}ms, BEGIN {begin}'
+        self.stdout.write(line)
+
+    def report(self, mode, stats, options):
+        latencies = sorted(stats['latencies']) or [0]
+        attempts = len(stats['latencies'])
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+
+        self.stdout.write(self.style.SUCCESS(f'{mode}:'))
+        self.stdout.write(f'  attempts      {attempts} ({attempts / options["seconds"]:.1f}/s)')
+        self.stdout.write(f'  holds         {stats["held"]} ({stats["held"] / options["seconds"]:.1f}/s)')
+        self.stdout.write(f'  conflicts     {stats["conflicts"]} ({stats["lost_seats"]} seats lost)')
+        self.stdout.write(f'  db errors     {stats["errors"]} ({stats["locked"]} "database is locked")')
+        self.stdout.write(f'  latency p50   {statistics.median(latencies) * 1000:.2f} ms')
+        self.stdout.write(f'  latency p95   {p95 * 1000:.2f} ms')
@@ -0,0 +1,112 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory
+from django.utils import timezone
+
+from movies.models import Movie, Theater
+from movies.pricing import price_table
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the template cost of movie_list, seat_selection and the booking '
+        'email: no loader cache (DEBUG), cached loader, and cached loader with '
+        'the {% cache %} fragments warm'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--theater', type=int, help='Show to render (default: the one with most seats)')
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/', HTTP_HOST='localhost')
+        request.user = User.objects.filter(is_superuser=False).first() or AnonymousUser()
+
+        cases = self.cases(request, options['theater'])
+        engines = {
+            'no loader cache': self.engine(settings.TEMPLATE_SOURCE_LOADERS),
+            'cached loader': self.engine([('django.template.loaders.cached.Loader', settings.TEMPLATE_SOURCE_LOADERS)]),
+        }
+
+        for name, context in cases:
+            self.stdout.write(self.style.SUCCESS(name))
+            for label, engine, warm_fragments in [
+                ('no loader cache', engines['no loader cache'], False),
+                ('cached loader', engines['cached loader'], False),
+                ('cached loader + fragments', engines['cached loader'], True),
+            ]:
+                timings = self.time(engine, name, context, request, warm_fragments, options['iterations'])
+                self.stdout.write(
+                    f'  {label:<28}{statistics.median(timings) * 1000:8.2f} ms'
+                    f'  (p95 {sorted(timings)[int(len(timings) * 0.95)] * 1000:.2f})'
+                )
+
+    def engine(self, loaders):
+        config = settings.TEMPLATES[0]
+        return DjangoTemplates({
+            'NAME': 'benchmark',
+            'DIRS': config.get('DIRS', []),
+            'APP_DIRS': False,
+            'OPTIONS': {**config['OPTIONS'], 'loaders': loaders},
+        })
+
+    def time(self, engine, name, context, request, warm_fragments, iterations):
+        timings = []
+        for _ in range(iterations):
+            if not warm_fragments:
+                cache.clear()
+            start = time.perf_counter()
+            # Lookup included: that is where the loader cache pays off
+            engine.get_template(name).render(context, request)
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    # =========================
+    # CONTEXTS (as the views build them, queries done up front)
+    # =========================
+    def cases(self, request, theater_id):
+        movies = list(Movie.objects.all())
+        if not movies:
+            raise CommandError('No movies to render; import a catalog first')
+
+        theaters = Theater.objects.select_related('movie')
+        if theater_id:
+            theater = theaters.filter(id=theater_id).first()
+        else:
+            # Seats may sit on another shard; pick by count there.
+            candidates = list(theaters.order_by('-date', '-id')[:50])
+            theater = max(candidates, key=lambda t: t.seats.count(), default=None)
+        if theater is None:
+            raise CommandError('No show to render')
+        seats = list(theater.seats.all())
+        booked = seats[:4]
+
+        return [
+            ('movies/movie_list.html', {
+                'movies': movies,
+                'genres': ['Action', 'Comedy', 'Drama', 'Romance', 'Thriller'],
+                'languages': ['English', 'Hindi', 'Tamil', 'Telugu'],
+                'selected_genre': None,
+                'selected_language': None,
+            }),
+            ('movies/seat_selection.html', {
+                'theater': theater,
+                'seats': seats,
+                'prices': price_table(theater),
+            }),
+            ('movies/booking_email.html', {
+                'user': request.user,
+                'movie': theater.movie,
+                'theater': theater,
+                'seats': ', '.join(seat.seat_number for seat in booked),
+                'booking_date': timezone.now(),
+                'booking_ids': ', '.join(str(seat.id) for seat in booked),
+                'total_amount': 800,
+            }),
+        ]
@@ -0,0 +1,75 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from movies.images import VARIANT_WIDTHS, render_variants, store_variants
+from movies.models import Movie
+
+
+class Command(BaseCommand):
+    help = 'Generate resized JPEG/WebP poster variants for existing movies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+        parser.add_argument('--force', action='store_true', help='Rebuild variants that already exist')
+
+    def handle(self, *args, **options):
+        movies = Movie.objects.exclude(image='').only('id', 'image', 'image_variants')
+        todo = [
+            (movie.id, movie.image)
+            for movie in movies.iterator()
+            if options['force'] or movie.image_variants.get('source') != movie.image.name
+        ]
+        if not todo:
+            self.stdout.write(self.style.SUCCESS('All posters already have variants'))
+            return
+
+        done = failed = 0
+        max_in_flight = options['workers'] * 2
+
+        # Pillow runs in worker processes; reads, storage writes and DB
+        # updates stay here.  Only a couple of images per worker are in
+        # flight, so memory stays flat however big the catalogue is.
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            pending = {}
+            queue = iter(todo)
+
+            while True:
+                for movie_id, image in queue:
+                    try:
+                        with image.open('rb'):
+                            data = image.read()
+                    except OSError as exc:
+                        failed += 1
+                        self.stderr.write(f'Skipped {image.name}: {exc}')
+                        continue
+
+                    future = pool.submit(render_variants, data, VARIANT_WIDTHS)
+                    pending[future] = (movie_id, image.name)
+                    if len(pending) >= max_in_flight:
+                        break
+
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    movie_id, name = pending.pop(future)
+                    try:
+                        manifest = store_variants(name, future.result())
+                    except Exception as exc:
+                        failed += 1
+                        self.stderr.write(f'Skipped {name}: {exc}')
+                        continue
+
+                    Movie.objects.filter(id=movie_id).update(
+                        image_variants=manifest, updated_at=timezone.now()
+                    )
+                    done += 1
+                    self.stdout.write(f'Built variants for {name}')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully built variants for {done} posters ({failed} failed)')
+        )
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.recommendations import build_recommendations, top_k
+
+
+class Command(BaseCommand):
+    help = 'Rebuild "people who booked this also booked" from all bookings (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=None, help='Neighbours kept per movie')
+        parser.add_argument(
+            '--min-common', type=int, default=1,
+            help='Ignore movie pairs booked together by fewer users than this',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        stats = build_recommendations(k=options['top_k'] or top_k(), min_common=options['min_common'])
+
+        self.stdout.write(
+            f'{stats["pairs"]} user/movie pairs from {stats["users"]} users '
+            f'over {stats["movies"]} movies'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully stored {stats["recommendations"]} recommendations '
+            f'in {time.perf_counter() - start:.1f}s'
+        ))
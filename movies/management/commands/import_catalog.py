@@ -0,0 +1,316 @@
+import csv
+import json
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from string import ascii_uppercase
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
+
+from booktheticket.routers import pin_to_primary
+from movies.models import Movie, Seat, Theater, youtube_video_id
+from movies.shards import choose_shard, seat_counts
+
+# Columns copied onto Movie; only the ones present in a row are updated.
+MOVIE_FIELDS = ['genre', 'rating', 'cast', 'description', 'trailer_url', 'image']
+
+
+def read_rows(path, fmt):
+    """Yield ``(line_number, dict)`` one row at a time."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    yield number, json.loads(line)
+
+
+def row_labels(count):
+    """A, B, ..., Z, AA, AB, ... (the order the allocator reads rows in)."""
+    labels = []
+    for n in range(count):
+        label = ''
+        n += 1
+        while n:
+            n, rest = divmod(n - 1, 26)
+            label = ascii_uppercase[rest] + label
+        labels.append(label)
+    return labels
+
+
+def parse_layout(value):
+    """"10x20" -> (10 rows, 20 seats per row)."""
+    try:
+        rows, per_row = (int(part) for part in str(value).lower().split('x'))
+    except ValueError:
+        raise ValidationError(f'layout must look like 10x20, not {value!r}')
+    if not (0 < rows <= 52 and 0 < per_row <= 100):
+        raise ValidationError(f'layout {value!r} is out of range')
+    return rows, per_row
+
+
+class Command(BaseCommand):
+    help = (
+        'Import movies and showtimes from a CSV or JSONL feed. One row per '
+        'movie, or per showtime when it has theater/date/time columns. Movies '
+        'are matched on (name, language) and shows on (movie, theater, date, '
+        'time), so re-running the same feed changes nothing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Default: from the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--layout', default='',
+            help='Seats for new shows, e.g. 10x20 (rows x seats); a "layout" column overrides it',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Validate only')
+
+    def handle(self, *args, **options):
+        # Ids of rows written below are read straight back; a replica
+        # wouldn't have them yet (or ever, inside the transaction).
+        pin_to_primary()
+        fmt = options['format'] or ('jsonl' if options['path'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        self.layout = options['layout']
+        self.dry_run = options['dry_run']
+        self.counts = Counter()
+        self.seen = set()  # movie keys, so repeats across batches count once
+
+        try:
+            rows = read_rows(options['path'], fmt)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                self.import_batch(batch)
+        except (OSError, json.JSONDecodeError, csv.Error) as e:
+            raise CommandError(f'Could not read {options["path"]}: {e}')
+
+        c = self.counts
+        summary = (
+            f'movies: {c["movies_created"]} created, {c["movies_updated"]} updated, '
+            f'{c["movies_unchanged"]} unchanged; '
+            f'shows: {c["shows_created"]} created, {c["shows_unchanged"]} unchanged; '
+            f'seats: {c["seats_created"]} created; invalid rows: {c["invalid"]}'
+        )
+        if self.dry_run:
+            self.stdout.write(f'Dry run, nothing written. Would import {summary}')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Successfully imported {summary}'))
+            if c['new_posters']:
+                self.stdout.write('Run build_poster_variants to resize new posters.')
+
+    # =========================
+    # ONE BATCH
+    # =========================
+    def import_batch(self, batch):
+        rows = []
+        for number, row in batch:
+            if not isinstance(row, dict):
+                self.invalid(number, 'not an object')
+                continue
+            row = {k.strip().lower(): v.strip() if isinstance(v, str) else v for k, v in row.items() if k}
+            row = {k: v for k, v in row.items() if v not in ('', None)}
+            if not row.get('name') or not row.get('language'):
+                self.invalid(number, 'name and language are required')
+                continue
+            rows.append((number, row))
+
+        keys = {(row['name'], row['language']) for _, row in rows}
+        existing = {
+            (movie.name, movie.language): movie
+            for movie in Movie.objects.filter(name__in={name for name, _ in keys})
+            if (movie.name, movie.language) in keys
+        }
+
+        movies, changed, valid = {}, {}, []
+        for number, row in rows:
+            key = (row['name'], row['language'])
+            movie = movies.get(key) or existing.get(key) or Movie(name=key[0], language=key[1])
+            try:
+                show = self.parse_show(row)
+                fields = self.apply(movie, row)
+            except ValidationError as e:
+                self.invalid(number, '; '.join(e.messages))
+                continue
+
+            movies[key] = movie
+            if fields:
+                changed.setdefault(key, set()).update(fields)
+            valid.append((key, show))
+
+        to_create = [m for key, m in movies.items() if m.pk is None]
+        to_update = [m for key, m in movies.items() if m.pk is not None and key in changed]
+        self.counts['movies_created'] += len(to_create)
+        self.counts['movies_updated'] += len(to_update)
+        self.counts['movies_unchanged'] += len(
+            [key for key, m in movies.items() if m.pk is not None and key not in changed and key not in self.seen]
+        )
+        self.seen.update(movies)
+        self.counts['new_posters'] += len([key for key in changed if 'image' in changed[key]])
+
+        shows = [(key, show) for key, show in valid if show]
+        if self.dry_run:
+            self.upsert_shows([(movies[key], show) for key, show in shows])
+            return
+
+        with transaction.atomic():
+            if to_update:
+                fields = set().union(*(changed[(m.name, m.language)] for m in to_update))
+                # bulk_update skips auto_now; the cached cards key on it
+                now = timezone.now()
+                for movie in to_update:
+                    movie.updated_at = now
+                Movie.objects.bulk_update(to_update, sorted(fields | {'updated_at'}))
+            if to_create:
+                # Rows another import got in first are skipped (unique on
+                # name/language); the lookup below picks up their ids.
+                Movie.objects.bulk_create(to_create, ignore_conflicts=True)
+                # SQLite/MySQL don't hand back ids from bulk_create
+                for movie in Movie.objects.filter(name__in={m.name for m in to_create}).order_by('id'):
+                    if (movie.name, movie.language) in movies:
+                        movies[(movie.name, movie.language)].pk = movie.pk
+
+            laid_out = self.upsert_shows(
+                [(movies[key], show) for key, show in shows]
+            )
+
+        # Seats for shows that have none yet (new, or an earlier run died
+        # before getting to them); one count query per shard.
+        if laid_out:
+            counts = seat_counts([theater for theater, _ in laid_out], timezone.now())
+            for theater, layout in laid_out:
+                if theater.id not in counts:
+                    self.create_seats(theater, layout)
+
+    def apply(self, movie, row):
+        """Copy the row onto ``movie``; return the names of changed fields."""
+        before = {name: getattr(movie, name) for name in [*MOVIE_FIELDS, 'trailer_video_id']}
+        try:
+            return self._apply(movie, row)
+        except ValidationError:
+            # The instance may be shared with earlier rows of the batch.
+            for name, value in before.items():
+                setattr(movie, name, value)
+            raise
+
+    def _apply(self, movie, row):
+        changed = []
+        for name in MOVIE_FIELDS:
+            if name not in row:
+                continue
+            value = row[name]
+            if name == 'rating':
+                try:
+                    value = Decimal(str(value))
+                except InvalidOperation:
+                    raise ValidationError(f'rating {value!r} is not a number')
+            if name == 'image':
+                if movie.image.name != value:
+                    movie.image = value
+                    changed.append(name)
+                continue
+            if getattr(movie, name) != value:
+                setattr(movie, name, value)
+                changed.append(name)
+
+        if 'trailer_url' in changed:
+            movie.trailer_video_id = youtube_video_id(movie.trailer_url)
+            changed.append('trailer_video_id')
+
+        # New movies need every required field; existing ones only what changed.
+        if movie.pk is None:
+            exclude = ['image'] if not movie.image else []
+        else:
+            exclude = [f.name for f in Movie._meta.fields if f.name not in changed]
+        movie.clean_fields(exclude=exclude)
+        return changed
+
+    def parse_show(self, row):
+        if not any(name in row for name in ('theater', 'date', 'time')):
+            return None
+        missing = [name for name in ('theater', 'time') if name not in row]
+        if missing:
+            raise ValidationError(f'showtime needs {", ".join(missing)}')
+
+        show_time = parse_time(str(row['time']))
+        show_date = parse_date(str(row['date'])) if 'date' in row else None
+        if show_time is None or ('date' in row and show_date is None):
+            raise ValidationError(f'bad date/time {row.get("date")!r} {row["time"]!r}')
+
+        layout = row.get('layout', self.layout)
+        return {
+            'name': str(row['theater'])[:225],
+            'date': show_date,
+            'time': show_time,
+            'layout': parse_layout(layout) if layout else None,
+        }
+
+    def upsert_shows(self, shows):
+        """
+        Create the shows that don't exist yet; return every show that has a
+        seat layout in the feed, with that layout.
+        """
+        wanted = {}
+        for movie, show in shows:
+            wanted[(movie.pk, show['name'], show['date'], show['time'])] = show['layout']
+
+        existing = set(
+            Theater.objects.filter(
+                movie_id__in={movie_id for movie_id, _, _, _ in wanted},
+                name__in={name for _, name, _, _ in wanted},
+            ).values_list('movie_id', 'name', 'date', 'time')
+        )
+        missing = [key for key in wanted if key not in existing]
+        self.counts['shows_unchanged'] += len(wanted) - len(missing)
+        if self.dry_run:
+            self.counts['shows_created'] += len(missing)
+            return []
+
+        # bulk_create skips Theater.save(), so place them on a shard here.
+        # Shows created since the lookup above are left as they are.
+        Theater.objects.bulk_create([
+            Theater(movie_id=movie_id, name=name, date=date, time=time, shard=choose_shard())
+            for movie_id, name, date, time in missing
+        ], ignore_conflicts=True)
+
+        # Counted from what is there now: ignore_conflicts doesn't say
+        # which rows went in, and SQLite skips failed ones silently.
+        theaters = list(Theater.objects.filter(
+            movie_id__in={key[0] for key in wanted},
+            name__in={key[1] for key in wanted},
+        ))
+        present = {(theater.movie_id, theater.name, theater.date, theater.time) for theater in theaters}
+        self.counts['shows_created'] += len([key for key in missing if key in present])
+
+        laid_out = {key: layout for key, layout in wanted.items() if layout}
+        return [
+            (theater, laid_out[key])
+            for theater in theaters
+            for key in [(theater.movie_id, theater.name, theater.date, theater.time)]
+            if key in laid_out
+        ]
+
+    def create_seats(self, theater, layout):
+        rows, per_row = layout
+        theater.seats.bulk_create([
+            Seat(theater=theater, seat_number=f'{label}{number}', time=theater.time)
+            for label in row_labels(rows)
+            for number in range(1, per_row + 1)
+        ])
+        self.counts['seats_created'] += rows * per_row
+
+    def invalid(self, number, message):
+        self.counts['invalid'] += 1
+        if self.counts['invalid'] <= 50:
+            self.stderr.write(f'row {number}: {message}')
+        elif self.counts['invalid'] == 51:
+            self.stderr.write('... more invalid rows not shown')
@@ -0,0 +1,160 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count
+
+from booktheticket.routers import pin_to_primary
+from movies.models import Booking, Seat, Theater
+from movies.shards import fan_out, forget_placement, shard_aliases, shard_of
+
+
+class Command(BaseCommand):
+    help = (
+        'Even out seat shards by moving whole theaters (seats + bookings). '
+        'Seat ids change on the new shard, so run it when the moved shows '
+        'have no checkouts in progress.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only print the plan')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--theater', type=int, help='Move just this theater...')
+        parser.add_argument('--to', help='...to this shard')
+
+    def handle(self, *args, **options):
+        # Placements must be current: planning or copying from a replica
+        # that hasn't seen an earlier move would orphan the real seats.
+        pin_to_primary()
+        aliases = shard_aliases()
+
+        if options['theater']:
+            if options['to'] not in aliases:
+                raise CommandError(f'--to must be one of {", ".join(aliases)}')
+            moves = [(Theater.objects.get(id=options['theater']), options['to'])]
+        else:
+            moves = self.plan(aliases)
+
+        if not moves:
+            self.stdout.write(self.style.SUCCESS('Shards are already balanced'))
+            return
+
+        for theater, target in moves:
+            self.stdout.write(f'{theater.id} {theater.name}: {shard_of(theater)} -> {target}')
+            if not options['dry_run']:
+                self.move(theater, target, options['batch_size'])
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Successfully moved {len(moves)} theaters'))
+
+    def plan(self, aliases):
+        """Greedy moves from the fullest to the emptiest shard, by seat count."""
+        sizes = Counter()
+        for rows in fan_out(lambda alias: list(
+            Seat.objects.using(alias).values('theater_id').annotate(n=Count('id')).values_list('theater_id', 'n')
+        )):
+            sizes.update(dict(rows))
+
+        theaters = {t.id: t for t in Theater.objects.all()}
+        placed = {alias: set() for alias in aliases}
+        moves = []
+
+        # Theaters on shards that are no longer configured have to move.
+        for theater in theaters.values():
+            if shard_of(theater) in placed:
+                placed[shard_of(theater)].add(theater.id)
+            else:
+                moves.append(theater.id)
+
+        load = {alias: sum(sizes[t] for t in ids) for alias, ids in placed.items()}
+        for theater_id in moves:
+            target = min(load, key=load.get)
+            placed[target].add(theater_id)
+            load[target] += sizes[theater_id]
+
+        while True:
+            fullest, emptiest = max(load, key=load.get), min(load, key=load.get)
+            gap = load[fullest] - load[emptiest]
+            # Moving a theater smaller than the gap always narrows it.
+            candidates = [t for t in placed[fullest] if 0 < sizes[t] < gap]
+            if not candidates:
+                break
+
+            theater_id = min(candidates, key=lambda t: abs(gap / 2 - sizes[t]))
+            placed[fullest].remove(theater_id)
+            placed[emptiest].add(theater_id)
+            load[fullest] -= sizes[theater_id]
+            load[emptiest] += sizes[theater_id]
+            moves.append(theater_id)
+
+        final = {t: alias for alias, ids in placed.items() for t in ids}
+        return [
+            (theaters[t], final[t])
+            for t in dict.fromkeys(moves)
+            if final[t] != shard_of(theaters[t])
+        ]
+
+    def move(self, theater, target, batch_size):
+        source = shard_of(theater)
+        returns_ids = connections[target].features.can_return_rows_from_bulk_insert
+
+        # 1. Copy seats (new ids on the target) and bookings, remapping seat ids.
+        with transaction.atomic(using=target):
+            seat_ids = {}
+            seats = Seat.objects.using(source).filter(theater_id=theater.id).order_by('id')
+            for batch in self.batches(seats, batch_size):
+                copies = [self.copy(seat) for seat in batch]
+                if returns_ids:
+                    Seat.objects.using(target).bulk_create(copies)
+                else:
+                    for copy in copies:
+                        copy.save(using=target)
+                seat_ids.update((old.id, new.id) for old, new in zip(batch, copies))
+
+            bookings = Booking.objects.using(source).filter(theater_id=theater.id).order_by('id')
+            for batch in self.batches(bookings, batch_size):
+                copies = [self.copy(booking, seat_id=seat_ids[booking.seat_id]) for booking in batch]
+                Booking.objects.using(target).bulk_create(copies)
+                if not returns_ids:
+                    copies = list(Booking.objects.using(target).filter(
+                        seat_id__in=[c.seat_id for c in copies]
+                    ).order_by('id'))
+                # auto_now_add overwrote booked_at on insert; put it back.
+                for copy, original in zip(copies, batch):
+                    copy.booked_at = original.booked_at
+                Booking.objects.using(target).bulk_update(copies, ['booked_at'])
+
+        # 2. Switch placement, then 3. drop the old rows.
+        Theater.objects.filter(id=theater.id).update(shard=target)
+        forget_placement(theater.id)
+        theater.shard = target
+
+        with transaction.atomic(using=source):
+            Booking.objects.using(source).filter(theater_id=theater.id).delete()
+            while True:
+                ids = list(
+                    Seat.objects.using(source).filter(theater_id=theater.id).values_list('id', flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                Seat.objects.using(source).filter(id__in=ids).delete()
+
+    @staticmethod
+    def batches(queryset, size):
+        batch = []
+        for obj in queryset.iterator(chunk_size=size):
+            batch.append(obj)
+            if len(batch) == size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def copy(obj, **changes):
+        obj = type(obj)(**{
+            f.attname: getattr(obj, f.attname) for f in obj._meta.concrete_fields if not f.primary_key
+        })
+        for name, value in changes.items():
+            setattr(obj, name, value)
+        return obj
@@ -1,23 +1,14 @@
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from movies.models import Seat
+from movies.holds import release_expired
 
 class Command(BaseCommand):
     help = 'Release expired seat reservations'
 
     def handle(self, *args, **options):
-        expired_seats = Seat.objects.filter(
-            reserved_until__lt=timezone.now(),
-            reserved_by__isnull=False
-        )
-        
-        count = expired_seats.update(
-            reserved_by=None,
-            reserved_until=None
-        )
+        count = release_expired()
         
         self.stdout.write(
             self.style.SUCCESS(
                 f'Successfully released {count} expired seat reservations'
             )
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,69 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError, OutputWrapper
+
+from movies.events import InvalidCursor, read_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Write hold/book/release events as JSON lines, reading forward from a '
+        'cursor. With --cursor-file the position is saved after every batch, '
+        'so a restarted tail carries on where it stopped (at-least-once).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cursor', help='Start after this position (default: the beginning)')
+        parser.add_argument('--cursor-file', help='Load the position from / save it to this file')
+        parser.add_argument('--output', help='Append to this file instead of stdout')
+        parser.add_argument('--limit', type=int, default=1000, help='Events per shard per batch')
+        parser.add_argument('--follow', action='store_true', help='Keep polling for new events')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls with --follow')
+
+    def handle(self, *args, **options):
+        cursor = options['cursor']
+        cursor_file = options['cursor_file']
+        if cursor is None and cursor_file and os.path.exists(cursor_file):
+            with open(cursor_file) as f:
+                cursor = f.read().strip()
+
+        target = open(options['output'], 'a', encoding='utf-8') if options['output'] else None
+        out = OutputWrapper(target) if target else self.stdout
+        written = 0
+        try:
+            while True:
+                try:
+                    events, cursor, more = read_events(cursor, options['limit'])
+                except InvalidCursor as e:
+                    raise CommandError(str(e))
+
+                for event in events:
+                    out.write(json.dumps(event.as_dict()))
+                out.flush()
+                written += len(events)
+
+                # Only after the lines are out: a crash in between replays
+                # the batch rather than losing it.
+                if cursor_file and events:
+                    self.save_cursor(cursor_file, cursor)
+
+                if more:
+                    continue
+                if not options['follow']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if target:
+                target.close()
+
+        self.stderr.write(f'{written} events, cursor {cursor}')
+
+    def save_cursor(self, path, cursor):
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(cursor)
+        os.replace(tmp, path)
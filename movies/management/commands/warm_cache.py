@@ -0,0 +1,159 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from movies import views
+from movies.models import Theater
+from movies.pricing import price_key, price_table
+from movies.shards import PLACEMENT_CACHE_SECONDS, placement_key, shard_of
+from users.views import home
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the shared cache for a movie or date range before bookings open: '
+        'shard placements, price tables, movie cards and seat page fragments, '
+        'by rendering the catalog, search, theater list and seat pages the way '
+        'visitors will. Then checks that the entries are there.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movie', type=int, action='append', help='Movie id (repeatable)')
+        parser.add_argument('--from', dest='date_from', help='First show date, YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', help='Last show date, YYYY-MM-DD')
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument(
+            '--min-hit-ratio', type=float, default=0.99,
+            help='Fail if fewer of the warmed entries than this are readable back',
+        )
+
+    def handle(self, *args, **options):
+        theaters = self.select(options)
+        if not theaters:
+            raise CommandError('No upcoming shows match')
+        movies = list({theater.movie_id: theater.movie for theater in theaters}.values())
+
+        backend = caches['default']
+        if isinstance(backend, (LocMemCache, DummyCache)):
+            self.stderr.write(self.style.WARNING(
+                f'The default cache is {type(backend).__name__}: entries warmed here stay in '
+                'this process and the web workers will not see them. Configure a shared '
+                'cache (Memcached/Redis) in CACHES.'
+            ))
+
+        self.factory = RequestFactory()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            shows = list(pool.map(self.task(self.warm_show), theaters))
+            list(pool.map(self.task(self.warm_movie), movies))
+            self.task(self.warm_catalog)()
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f'Warmed {len(theaters)} shows of {len(movies)} movies in {elapsed:.1f}s '
+            f'({options["workers"]} workers)'
+        )
+        self.verify(theaters, movies, shows, options['min_hit_ratio'])
+
+    def select(self, options):
+        if not (options['movie'] or options['date_from'] or options['date_to']):
+            raise CommandError('Give --movie and/or --from/--to')
+
+        theaters = Theater.objects.select_related('movie').exclude(date__lt=timezone.localdate())
+        if options['movie']:
+            theaters = theaters.filter(movie_id__in=options['movie'])
+        for option, lookup in [('date_from', 'date__gte'), ('date_to', 'date__lte')]:
+            if options[option]:
+                day = parse_date(options[option])
+                if day is None:
+                    raise CommandError(f'Bad date {options[option]!r}')
+                theaters = theaters.filter(**{lookup: day})
+        return list(theaters.order_by('date', 'time', 'id'))
+
+    def task(self, fn):
+        # Each pool thread opens its own connections; don't leave them open.
+        def run(*args):
+            try:
+                return fn(*args)
+            finally:
+                connections.close_all()
+        return run
+
+    def request(self, path, **params):
+        request = self.factory.get(path, params)
+        request.user = AnonymousUser()
+        return request
+
+    # =========================
+    # WARMING
+    # =========================
+    def warm_show(self, theater):
+        """Placement, prices and the seat page's cached fragments."""
+        shard_of(theater.id)
+        prices = price_table(theater)
+        seats = list(theater.seats.all())
+        render_to_string(
+            'movies/seat_selection.html',
+            {'theater': theater, 'seats': seats, 'prices': prices},
+            request=self.request(reverse('book_seats', args=[theater.id])),
+        )
+        return len(seats), prices
+
+    def warm_movie(self, movie):
+        # Nothing on the theater list is cached; this primes the database
+        # (and replica) buffers for the schedule and seat-count queries.
+        views.theater_list(self.request(reverse('theater_list', args=[movie.id])), movie.id)
+        # Search results reuse the movie cards.
+        views.movie_list(self.request(reverse('movie_list'), search=movie.name))
+
+    def warm_catalog(self):
+        views.movie_list(self.request(reverse('movie_list')))
+        home(self.request('/'))
+
+    # =========================
+    # VERIFICATION
+    # =========================
+    def verify(self, theaters, movies, shows, min_hit_ratio):
+        expected = {'placement': [], 'price table': [], 'seat page': [], 'movie card': []}
+        for theater, (seat_count, prices) in zip(theaters, shows):
+            expected['placement'].append(placement_key(theater.id))
+            expected['price table'].append(price_key(theater))
+            expected['seat page'].append(make_template_fragment_key(
+                'seat_header', [theater.id, theater.updated_at, theater.movie.updated_at, seat_count]
+            ))
+            expected['seat page'].append(make_template_fragment_key('seat_legend', [prices.items()]))
+        for movie in movies:
+            expected['movie card'].append(make_template_fragment_key('movie_card', [movie.id, movie.updated_at]))
+
+        hits = total = 0
+        for kind, keys in expected.items():
+            keys = list(dict.fromkeys(keys))  # shows can share a legend
+            found = 0
+            for i in range(0, len(keys), 1000):
+                found += len(cache.get_many(keys[i:i + 1000]))
+            self.stdout.write(f'  {kind:<12}{found:>7}/{len(keys):<7}{found / len(keys):7.1%}')
+            hits += found
+            total += len(keys)
+
+        ratio = hits / total
+        if ratio < min_hit_ratio:
+            raise CommandError(
+                f'Only {ratio:.1%} of warmed entries are in the cache (minimum {min_hit_ratio:.0%}); '
+                'is it large enough to hold them?'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Cache warm: {ratio:.1%} hit ratio. Placements expire after '
+            f'{PLACEMENT_CACHE_SECONDS // 60} minutes, so run this shortly before bookings open.'
+        ))
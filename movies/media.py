@@ -0,0 +1,148 @@
+"""
+Serving uploaded media (posters) outside DEBUG.
+
+Answers conditional requests (``If-None-Match`` / ``If-Modified-Since``)
+with 304s, honours single byte ranges, and sets long cache lifetimes:
+content-hashed poster variants are marked immutable for a year, other
+files get ``MEDIA_CACHE_MAX_AGE``.
+
+Behind nginx or Apache set ``MEDIA_SENDFILE`` to ``"x-accel-redirect"``
+or ``"x-sendfile"`` and the worker only sends headers; the web server
+streams the bytes (and handles ranges) itself.
+"""
+import mimetypes
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotAllowed,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{12}\.[A-Za-z0-9]+$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+ONE_YEAR = 365 * 24 * 60 * 60
+
+
+def cache_control(path):
+    if HASHED_NAME_RE.search(path):
+        return f"public, max-age={ONE_YEAR}, immutable"
+    return f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 86400)}"
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+    return if_modified_since is not None and int(mtime) <= if_modified_since
+
+
+def requested_range(request, size, etag, last_modified):
+    """
+    Return ``(start, end)`` (inclusive) for a single satisfiable byte
+    range, ``None`` to send the whole file, or ``False`` if the range
+    cannot be satisfied.
+    """
+    header = request.META.get("HTTP_RANGE", "")
+    match = RANGE_RE.match(header.replace(" ", ""))
+    if not match:
+        # No range, or several ranges: a full 200 is always allowed.
+        return None
+
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if if_range and if_range not in (etag, last_modified):
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # "-500": the last 500 bytes
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def iter_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_media(request, path):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+
+    try:
+        fullpath = Path(safe_join(settings.MEDIA_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404("Not found")
+    if not fullpath.is_file():
+        raise Http404("Not found")
+
+    stat = fullpath.stat()
+    size = stat.st_size
+    etag = f'"{int(stat.st_mtime):x}-{size:x}"'
+    last_modified = http_date(stat.st_mtime)
+    content_type = mimetypes.guess_type(str(fullpath))[0] or "application/octet-stream"
+
+    if not_modified(request, etag, stat.st_mtime):
+        response = HttpResponseNotModified()
+
+    elif getattr(settings, "MEDIA_SENDFILE", None) == "x-accel-redirect":
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = getattr(settings, "MEDIA_ACCEL_PREFIX", "/protected-media/") + quote(path)
+
+    elif getattr(settings, "MEDIA_SENDFILE", None) == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = str(fullpath)
+
+    else:
+        byte_range = requested_range(request, size, etag, last_modified)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+        elif byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            body = iter_range(fullpath, start, length) if request.method == "GET" else []
+            response = StreamingHttpResponse(body, status=206, content_type=content_type)
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = str(length)
+        elif request.method == "HEAD":
+            response = HttpResponse(content_type=content_type)
+            response["Content-Length"] = str(size)
+        else:
+            # FileResponse lets the WSGI server use sendfile() when it can.
+            response = FileResponse(fullpath.open("rb"), content_type=content_type)
+
+    response["ETag"] = etag
+    response["Last-Modified"] = last_modified
+    response["Cache-Control"] = cache_control(path)
+    if response.status_code != 304:
+        response["Accept-Ranges"] = "bytes"
+    return response
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2026-10-19 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0004_seat_reserved_by_seat_reserved_until_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="seat",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
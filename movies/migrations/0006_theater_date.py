@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2026-10-19 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0005_seat_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="theater",
+            name="date",
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
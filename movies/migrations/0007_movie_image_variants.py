@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2026-10-19 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0006_theater_date"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
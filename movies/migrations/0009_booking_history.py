@@ -0,0 +1,60 @@
+# Generated by Django 3.2.19 on 2026-10-19 13:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("movies", "0008_seat_shards"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookingHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("seat_number", models.CharField(max_length=10)),
+                ("booked_at", models.DateTimeField()),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="movies.movie"
+                    ),
+                ),
+                (
+                    "theater",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="movies.theater"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "booking history",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="bookinghistory",
+            constraint=models.UniqueConstraint(
+                fields=("theater", "seat_number"), name="unique_archived_seat"
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.19 on 2026-10-19 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0009_booking_history"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["user", "-booked_at"], name="booking_user_recent_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookinghistory",
+            index=models.Index(
+                fields=["user", "-booked_at"], name="history_user_recent_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="seat",
+            index=models.Index(
+                fields=["theater", "is_booked", "reserved_until"],
+                name="seat_availability_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="seat",
+            index=models.Index(
+                condition=models.Q(("reserved_by__isnull", False)),
+                fields=["reserved_until", "reserved_by"],
+                name="seat_hold_expiry_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="theater",
+            index=models.Index(
+                fields=["movie", "date", "time"], name="theater_movie_schedule_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.19 on 2026-10-19 13:06
+
+import re
+
+from django.db import migrations, models
+
+
+def backfill_video_ids(apps, schema_editor):
+    Movie = apps.get_model("movies", "Movie")
+    # The database being migrated, not wherever the routers send reads
+    db = schema_editor.connection.alias
+    pattern = re.compile(r"(?:v=|youtu\.be/|embed/)([^&?/]+)")
+    movies = []
+    for movie in Movie.objects.using(db).exclude(trailer_url=""):
+        match = pattern.search(movie.trailer_url)
+        if match:
+            movie.trailer_video_id = match.group(1)[:20]
+            movies.append(movie)
+    Movie.objects.using(db).bulk_update(movies, ["trailer_video_id"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0010_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="trailer_video_id",
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        migrations.RunPython(backfill_video_ids, migrations.RunPython.noop),
+    ]
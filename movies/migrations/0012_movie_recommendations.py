@@ -0,0 +1,55 @@
+# Generated by Django 3.2.19 on 2026-10-19 13:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0011_movie_trailer_video_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MovieRecommendation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.FloatField()),
+                ("rank", models.PositiveSmallIntegerField()),
+                (
+                    "movie",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recommendations",
+                        to="movies.movie",
+                    ),
+                ),
+                (
+                    "recommended",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="movies.movie",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["movie", "rank"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="movierecommendation",
+            constraint=models.UniqueConstraint(
+                fields=("movie", "rank"), name="unique_recommendation_rank"
+            ),
+        ),
+    ]
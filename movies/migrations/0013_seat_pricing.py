@@ -0,0 +1,88 @@
+# Generated by Django 3.2.19 on 2026-10-19 13:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0012_movie_recommendations"),
+    ]
+
+    operations = [
+        # Everything booked so far was charged the old flat ₹200.
+        migrations.AddField(
+            model_name="booking",
+            name="amount",
+            field=models.DecimalField(decimal_places=2, default=200, max_digits=8),
+        ),
+        migrations.AlterField(
+            model_name="booking",
+            name="amount",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+        migrations.AddField(
+            model_name="bookinghistory",
+            name="amount",
+            field=models.DecimalField(decimal_places=2, default=200, max_digits=8),
+        ),
+        migrations.AlterField(
+            model_name="bookinghistory",
+            name="amount",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+        migrations.AddField(
+            model_name="seat",
+            name="category",
+            field=models.CharField(
+                choices=[
+                    ("standard", "Standard"),
+                    ("premium", "Premium"),
+                    ("recliner", "Recliner"),
+                ],
+                default="standard",
+                max_length=20,
+            ),
+        ),
+        migrations.CreateModel(
+            name="ShowPrice",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "category",
+                    models.CharField(
+                        choices=[
+                            ("standard", "Standard"),
+                            ("premium", "Premium"),
+                            ("recliner", "Recliner"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("price", models.DecimalField(decimal_places=2, max_digits=8)),
+                (
+                    "theater",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="prices",
+                        to="movies.theater",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="showprice",
+            constraint=models.UniqueConstraint(
+                fields=("theater", "category"), name="unique_show_price"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.19 on 2026-10-19 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0013_seat_pricing"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="theater",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.19 on 2026-10-19 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0015_booking_events"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(fields=["-booked_at"], name="booking_recent_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="bookinghistory",
+            index=models.Index(fields=["-booked_at"], name="history_recent_idx"),
+        ),
+    ]
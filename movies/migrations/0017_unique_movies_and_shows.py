@@ -0,0 +1,53 @@
+# Generated by Django 3.2.19 on 2026-10-19 13:48
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicates(apps, schema_editor):
+    # Duplicates carry their own shows, seats and bookings; merging them
+    # is a judgement call, so stop and say which ones rather than guess.
+    db = schema_editor.connection.alias
+    Movie = apps.get_model("movies", "Movie")
+    Theater = apps.get_model("movies", "Theater")
+    clashes = [
+        f"movie {row['name']!r} ({row['language']})"
+        for row in Movie.objects.using(db)
+        .values("name", "language")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)[:20]
+    ] + [
+        f"show {row['name']!r} of movie {row['movie_id']} on {row['date']} at {row['time']}"
+        for row in Theater.objects.using(db)
+        .values("movie_id", "name", "date", "time")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)[:20]
+    ]
+    if clashes:
+        raise RuntimeError(
+            "Merge or rename these duplicates before migrating:\n  "
+            + "\n  ".join(clashes)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("movies", "0016_recent_booking_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="movie",
+            constraint=models.UniqueConstraint(
+                fields=("name", "language"), name="unique_movie_language"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="theater",
+            constraint=models.UniqueConstraint(
+                fields=("movie", "name", "date", "time"), name="unique_show"
+            ),
+        ),
+    ]
@@ -1,8 +1,23 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import User
 import re
 from django.utils import timezone
 from datetime import timedelta
+from django.core.files.storage import default_storage
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .images import build_variants, srcset
+from .pricing import SEAT_CATEGORIES
+from .shards import choose_shard, forget_placement, shard_aliases, shard_of
+
+YOUTUBE_ID_RE = re.compile(r"(?:v=|youtu\.be/|embed/)([^&?/]+)")
+
+
+def youtube_video_id(url):
+    """The video id of a YouTube watch/share/embed link, or ''."""
+    match = YOUTUBE_ID_RE.search(url or "")
+    return match.group(1)[:20] if match else ""
 
 class Movie(models.Model):
     GENRE_CHOICES = [
@@ -34,25 +49,60 @@ class Movie(models.Model):
         blank=True,
         help_text="Paste any YouTube trailer link"
     )
+    # Extracted from trailer_url on save/import
+    trailer_video_id = models.CharField(max_length=20, blank=True, editable=False)
+
+    # 🖼 Resized JPEG/WebP poster variants (see movies/images.py)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    # 🗝 Version for cached fragments (movie cards); bump it on .update()s
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # import_catalog matches movies on these
+            models.UniqueConstraint(fields=["name", "language"], name="unique_movie_language"),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.trailer_video_id = youtube_video_id(self.trailer_url)
+        super().save(*args, **kwargs)
+
+        # Build poster variants whenever a new image is uploaded
+        if self.image and self.image_variants.get("source") != self.image.name:
+            self.image_variants = build_variants(self.image)
+            self.updated_at = timezone.now()
+            Movie.objects.filter(pk=self.pk).update(
+                image_variants=self.image_variants, updated_at=self.updated_at
+            )
+
+    @property
+    def poster_url(self):
+        """Mid-size JPEG for plain <img src>, falling back to the original."""
+        jpegs = self.image_variants.get("jpeg")
+        if jpegs:
+            widths = sorted(jpegs, key=int)
+            return default_storage.url(jpegs[widths[len(widths) // 2]])
+        return self.image.url if self.image else ""
+
+    @property
+    def jpeg_srcset(self):
+        return srcset(self.image_variants, "jpeg")
+
+    @property
+    def webp_srcset(self):
+        return srcset(self.image_variants, "webp")
+
     # ✅ SAFE YouTube embed URL generator
     def get_trailer_embed_url(self):
-        if not self.trailer_url:
-            return ""
-
-        match = re.search(
-            r"(?:v=|youtu\.be/)([^&?/]+)",
-            self.trailer_url
-        )
+        video_id = self.trailer_video_id or youtube_video_id(self.trailer_url)
 
-        if not match:
+        if not video_id:
             return ""
 
-        video_id = match.group(1)
-
         return (
             f"https://www.youtube.com/embed/{video_id}"
             f"?rel=0&modestbranding=1"
@@ -66,21 +116,65 @@ class Theater(models.Model):
         on_delete=models.CASCADE,
         related_name='theaters'
     )
+    date = models.DateField(null=True, blank=True)
     time = models.TimeField()
 
+    # 🗄 Database holding this show's seats and bookings (blank = default)
+    shard = models.CharField(max_length=50, blank=True)
+
+    # 🗝 Version for the cached seat page header and price table
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # theater_list: a movie's shows in date/time order
+            models.Index(fields=["movie", "date", "time"], name="theater_movie_schedule_idx"),
+        ]
+        constraints = [
+            # import_catalog matches shows on these
+            models.UniqueConstraint(fields=["movie", "name", "date", "time"], name="unique_show"),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.movie.name} at {self.time}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.shard:
+            self.shard = choose_shard()
+        super().save(*args, **kwargs)
+        forget_placement(self.pk)
+
+
+class ShowPrice(models.Model):
+    """Price of a seat category for one show; missing ones use DEFAULT_SEAT_PRICES."""
+    theater = models.ForeignKey(Theater, on_delete=models.CASCADE, related_name="prices")
+    category = models.CharField(max_length=20, choices=SEAT_CATEGORIES)
+    price = models.DecimalField(max_digits=8, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["theater", "category"], name="unique_show_price"),
+        ]
+
+    def __str__(self):
+        return f"{self.theater} - {self.get_category_display()}: {self.price}"
+
 
 class Seat(models.Model):
+    # Seats live on their theater's shard, so the cross-database foreign
+    # keys below carry no DB constraint.
     theater = models.ForeignKey(
         Theater,
         on_delete=models.CASCADE,
-        related_name='seats'
+        related_name='seats',
+        db_constraint=False
     )
     seat_number = models.CharField(max_length=10)
     time = models.TimeField()
 
+    # 💺 Priced per show through ShowPrice / DEFAULT_SEAT_PRICES
+    category = models.CharField(max_length=20, choices=SEAT_CATEGORIES, default="standard")
+
     # FINAL STATES
     is_booked = models.BooleanField(default=False)
 
@@ -89,10 +183,29 @@ class Seat(models.Model):
         User,
         on_delete=models.SET_NULL,
         null=True,
-        blank=True
+        blank=True,
+        db_constraint=False
     )
     reserved_until = models.DateTimeField(null=True, blank=True)
 
+    # 🔢 Bumped on every hold/booking/release (optimistic locking)
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Seat map, seats-left counts and per-show hold checks
+            models.Index(
+                fields=["theater", "is_booked", "reserved_until"],
+                name="seat_availability_idx",
+            ),
+            # Expiry sweep (release_expired); only rows with a hold are indexed
+            models.Index(
+                fields=["reserved_until", "reserved_by"],
+                condition=models.Q(reserved_by__isnull=False),
+                name="seat_hold_expiry_idx",
+            ),
+        ]
+
     def is_reserved(self):
         if self.reserved_until and self.reserved_until > timezone.now():
             return True
@@ -109,11 +222,150 @@ class Seat(models.Model):
 
 
 class Booking(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Same shard as the seat; everything else lives on default.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
     seat = models.OneToOneField(Seat, on_delete=models.CASCADE)
-    movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
-    theater = models.ForeignKey(Theater, on_delete=models.CASCADE)
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, db_constraint=False)
+    theater = models.ForeignKey(Theater, on_delete=models.CASCADE, db_constraint=False)
     booked_at = models.DateTimeField(auto_now_add=True)
+    # 💰 What was charged for this seat, from the show's price table
+    amount = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            # profile: a user's bookings, newest first
+            models.Index(fields=["user", "-booked_at"], name="booking_user_recent_idx"),
+            # dashboard: latest bookings site-wide
+            models.Index(fields=["-booked_at"], name="booking_recent_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.movie.name}"
+
+    @property
+    def seat_number(self):
+        return self.seat.seat_number
+
+
+class BookingEvent(models.Model):
+    """
+    Append-only hold/book/release feed for downstream consumers (see
+    movies/events.py).  Written on the show's shard in the same
+    transaction as the seat change; never updated or deleted.
+    """
+    HOLD = "hold"
+    BOOK = "book"
+    RELEASE = "release"
+    KIND_CHOICES = [(HOLD, "Hold"), (BOOK, "Book"), (RELEASE, "Release")]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    theater = models.ForeignKey(
+        Theater, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    movie = models.ForeignKey(
+        Movie, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    # Plain ids: seats and bookings go away when the show is archived
+    seat_id = models.PositiveIntegerField()
+    seat_number = models.CharField(max_length=10)
+    user = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, null=True, db_constraint=False, related_name="+"
+    )
+    booking_id = models.PositiveIntegerField(null=True)
+    amount = models.DecimalField(max_digits=8, decimal_places=2, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.kind} {self.seat_number} (theater {self.theater_id})"
+
+    def as_dict(self):
+        return {
+            "shard": self._state.db,
+            "id": self.id,
+            "kind": self.kind,
+            "theater_id": self.theater_id,
+            "movie_id": self.movie_id,
+            "seat_id": self.seat_id,
+            "seat_number": self.seat_number,
+            "user_id": self.user_id,
+            "booking_id": self.booking_id,
+            "amount": str(self.amount) if self.amount is not None else None,
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+class BookingHistory(models.Model):
+    """
+    Bookings for shows that have been archived (``archive_past_shows``).
+
+    Append-only and compact: the seat is kept as its number, since the
+    show's Seat rows are deleted.  Lives on default, next to the catalog.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
+    theater = models.ForeignKey(Theater, on_delete=models.CASCADE)
+    seat_number = models.CharField(max_length=10)
+    booked_at = models.DateTimeField()
+    amount = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "booking history"
+        indexes = [
+            models.Index(fields=["user", "-booked_at"], name="history_user_recent_idx"),
+            models.Index(fields=["-booked_at"], name="history_recent_idx"),
+        ]
+        constraints = [
+            # A seat is sold once per show; makes re-running an archive safe.
+            models.UniqueConstraint(fields=["theater", "seat_number"], name="unique_archived_seat"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.movie.name} ({self.seat_number})"
+
+
+class MovieRecommendation(models.Model):
+    """
+    "People who booked this also booked": the top neighbours of each movie
+    by co-booking similarity, rebuilt by ``manage.py build_recommendations``.
+    """
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name="recommendations")
+    recommended = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ["movie", "rank"]
+        constraints = [
+            models.UniqueConstraint(fields=["movie", "rank"], name="unique_recommendation_rank"),
+        ]
+
+    def __str__(self):
+        return f"{self.movie} -> {self.recommended} ({self.score:.2f})"
+
+
+@receiver(pre_delete, sender=Theater)
+def delete_sharded_seats(sender, instance, using, **kwargs):
+    # The delete cascade only sees the theater's own database.
+    shard = shard_of(instance)
+    if shard != using:
+        Booking.objects.using(shard).filter(theater_id=instance.pk).delete()
+        Seat.objects.using(shard).filter(theater_id=instance.pk).delete()
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_bookings(sender, instance, using, **kwargs):
+    # Same problem for users: the cascade (bookings) and SET_NULL (holds)
+    # only reach the user's own database.
+    for shard in shard_aliases():
+        if shard != using:
+            Booking.objects.using(shard).filter(user_id=instance.pk).delete()
+            Seat.objects.using(shard).filter(reserved_by_id=instance.pk).update(
+                reserved_by=None, reserved_until=None, version=F("version") + 1
+            )
+
+
+@receiver(post_save, sender=ShowPrice)
+@receiver(post_delete, sender=ShowPrice)
+def reprice_show(sender, instance, **kwargs):
+    # New price_table key in every process, not just this one's cache
+    Theater.objects.filter(pk=instance.theater_id).update(updated_at=timezone.now())
@@ -0,0 +1,56 @@
+"""
+Seat prices.
+
+Every seat has a category; a show's price for each category comes from
+its ``ShowPrice`` rows, falling back to ``settings.DEFAULT_SEAT_PRICES``.
+The merged table is tiny, so it is built once per show and cached;
+pricing a checkout is then one cache lookup however many seats are in
+it.  The key carries ``Theater.updated_at``, which saving or deleting a
+``ShowPrice`` bumps, so every process moves to the new table at once.
+``Booking.amount`` keeps what was actually charged, so later price
+changes don't rewrite revenue.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+SEAT_CATEGORIES = [
+    ("standard", "Standard"),
+    ("premium", "Premium"),
+    ("recliner", "Recliner"),
+]
+
+PRICE_CACHE_SECONDS = 3600
+
+
+def default_prices():
+    prices = getattr(settings, "DEFAULT_SEAT_PRICES", {"standard": 200})
+    return {category: Decimal(str(price)) for category, price in prices.items()}
+
+
+def price_key(theater):
+    return f"price_table:{theater.pk}:{theater.updated_at.timestamp()}"
+
+
+def price_table(theater):
+    """``{category: Decimal}`` for a show, as of ``theater.updated_at``."""
+    from .models import ShowPrice
+
+    key = price_key(theater)
+    prices = cache.get(key)
+    if prices is None:
+        prices = default_prices()
+        prices.update(
+            ShowPrice.objects.filter(theater_id=theater.pk).values_list("category", "price")
+        )
+        cache.set(key, prices, timeout=PRICE_CACHE_SECONDS)
+    return prices
+
+
+def seat_price(prices, category):
+    try:
+        return prices[category]
+    except KeyError:
+        # A category nobody priced: charge the standard rate rather than 0.
+        return prices.get("standard", Decimal(0))
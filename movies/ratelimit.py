@@ -0,0 +1,136 @@
+"""
+Sliding-window rate limiting backed by the Django cache.
+
+Each (group, client) pair keeps one counter per fixed window.  The rate
+for the sliding window is estimated from the current and previous
+counters, weighted by how far into the current window we are, so a
+check costs one ``get_many`` plus one ``add``/``incr`` no matter how busy
+the client is.
+
+Limits are written as ``"<count>/<period>"`` (``"10/m"``, ``"100/h"``,
+``"5/30s"``) and can be overridden per group with ``settings.RATELIMITS``.
+"""
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+RATE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+RATE_RE = re.compile(r"^(\d+)/(\d*)([smhd])$")
+
+
+def parse_rate(rate):
+    """Turn ``"10/m"`` into ``(10, 60)``."""
+    match = RATE_RE.match(rate.strip())
+    if not match:
+        raise ValueError(f"Invalid rate: {rate!r}")
+
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * RATE_UNITS[unit]
+
+
+def client_ip(request):
+    """
+    The address the nearest ``RATELIMIT_PROXY_HOPS`` proxies saw.
+
+    Each proxy appends the address it was called from to
+    X-Forwarded-For, so only the rightmost ``hops`` entries can be
+    trusted; anything to their left came from the client and is free to
+    change per request.  With fewer entries than that (the request
+    skipped a proxy) fall back to ``REMOTE_ADDR``.
+    """
+    hops = getattr(settings, "RATELIMIT_PROXY_HOPS", 0)
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    entries = [entry.strip() for entry in forwarded.split(",") if entry.strip()]
+    if hops > 0 and len(entries) >= hops:
+        return entries[-hops]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def client_key(request, key):
+    if key == "ip":
+        return f"ip:{client_ip(request)}"
+    if key == "user" and request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    if key == "user":
+        return f"ip:{client_ip(request)}"
+    raise ValueError(f"Unknown rate limit key: {key!r}")
+
+
+def hit(group, client, limit, period, now=None):
+    """
+    Count one request for ``client`` and return ``(allowed, retry_after)``.
+
+    Rejected requests are not counted, so a client that backs off for
+    ``retry_after`` seconds is let through again.
+    """
+    now = now or time.time()
+    window = int(now // period)
+    elapsed = now - window * period
+
+    current_key = f"ratelimit:{group}:{client}:{window}"
+    previous_key = f"ratelimit:{group}:{client}:{window - 1}"
+    counts = cache.get_many([current_key, previous_key])
+    current = counts.get(current_key, 0)
+    previous = counts.get(previous_key, 0)
+
+    if previous * (period - elapsed) / period + current >= limit:
+        if current >= limit:
+            # This window becomes the previous one and has to decay too.
+            retry_after = period - elapsed + period * (1 - limit / current)
+        else:
+            # Wait until the previous window's share has decayed enough.
+            retry_after = period * (1 - (limit - current) / previous) - elapsed
+        # Strictly past the point where the estimate drops below the limit
+        return False, int(retry_after) + 1
+
+    if not cache.add(current_key, 1, timeout=period * 2):
+        try:
+            cache.incr(current_key)
+        except ValueError:
+            # Evicted between add() and incr(); start the window over.
+            cache.set(current_key, 1, timeout=period * 2)
+    return True, 0
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse(
+        "Too many requests. Please slow down and try again shortly.",
+        content_type="text/plain",
+        status=429,
+    )
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+def ratelimit(rate, key="user", methods=("POST",), group=None):
+    """
+    Limit a view to ``rate`` requests per client.
+
+    ``key`` is ``"user"`` (falls back to the IP for anonymous users) or
+    ``"ip"``; ``methods=None`` limits every method.  The group name
+    defaults to ``"<view name>:<key>"`` and is what ``settings.RATELIMITS``
+    uses to override the rate (``None`` there disables the limit).
+    """
+    def decorator(view):
+        name = group or f"{view.__name__}:{key}"
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            enabled = getattr(settings, "RATELIMIT_ENABLED", True)
+            view_rate = getattr(settings, "RATELIMITS", {}).get(name, rate)
+
+            if enabled and view_rate and (methods is None or request.method in methods):
+                limit, period = parse_rate(view_rate)
+                allowed, retry_after = hit(name, client_key(request, key), limit, period)
+                if not allowed:
+                    return too_many_requests(retry_after)
+
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
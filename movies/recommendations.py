@@ -0,0 +1,161 @@
+"""
+"People who booked this also booked" recommendations.
+
+Offline (``manage.py build_recommendations``): every distinct (user,
+movie) pair from the seat shards and booking history becomes a 1 in a
+sparse user x movie matrix ``X``.  ``C = X.T @ X`` counts, for each pair
+of movies, the users who booked both; the similarity is cosine,
+``C[i, j] / sqrt(n_i * n_j)`` with ``n_i`` the bookers of movie ``i``.
+Computing ``C`` costs the sum over users of (movies booked)^2, so it
+grows with bookings rather than users x movies.  The top
+``RECOMMENDATIONS_TOP_K`` neighbours of each movie go into
+``MovieRecommendation``.
+
+Online: pages only read that table.
+"""
+import numpy as np
+from scipy import sparse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Booking, BookingHistory, Movie, MovieRecommendation
+from .shards import fan_out, reporting_aliases
+
+
+def top_k():
+    return getattr(settings, "RECOMMENDATIONS_TOP_K", 8)
+
+
+# =========================
+# OFFLINE BUILD
+# =========================
+def booking_pairs():
+    """Distinct ``(user_id, movie_id)`` rows, as an ``(n, 2)`` int array."""
+    from booktheticket.routers import read_db
+
+    def pairs(bookings):
+        rows = bookings.values_list("user_id", "movie_id").distinct().iterator(chunk_size=10000)
+        return np.fromiter((v for row in rows for v in row), dtype=np.int64).reshape(-1, 2)
+
+    chunks = fan_out(lambda alias: pairs(Booking.objects.using(alias)), reporting_aliases())
+    chunks.append(pairs(BookingHistory.objects.using(read_db())))
+    # The same user/movie can turn up on several shards and in history.
+    return np.unique(np.concatenate(chunks), axis=0)
+
+
+def similarities(pairs, k, min_common=1):
+    """
+    Top ``k`` neighbours of every movie with co-bookings.
+
+    Returns parallel arrays ``(movie_ids, neighbour_ids, scores, ranks)``,
+    ranks starting at 0.
+    """
+    empty = np.array([], dtype=np.int64)
+    if not len(pairs):
+        return empty, empty, np.array([], dtype=np.float64), empty
+
+    users, user_index = np.unique(pairs[:, 0], return_inverse=True)
+    movies, movie_index = np.unique(pairs[:, 1], return_inverse=True)
+    X = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float64), (user_index, movie_index)),
+        shape=(len(users), len(movies)),
+    )
+
+    C = (X.T @ X).tocoo()
+    bookers = C.diagonal()
+    keep = (C.row != C.col) & (C.data >= min_common)
+    rows, cols, common = C.row[keep], C.col[keep], C.data[keep]
+    scores = common / np.sqrt(bookers[rows] * bookers[cols])
+
+    # Group by movie, best first (ties by id for stable output), then
+    # rank = position within the movie's block.
+    order = np.lexsort((movies[cols], -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    ranks = np.arange(len(rows)) - np.searchsorted(rows, rows, side="left")
+    top = ranks < k
+
+    return movies[rows[top]], movies[cols[top]], scores[top], ranks[top]
+
+
+def build_recommendations(k=None, min_common=1):
+    """Recompute and replace ``MovieRecommendation``; returns some stats."""
+    k = k or top_k()
+    pairs = booking_pairs()
+
+    # Bookings can outlive their movie (no FK constraint on the shards).
+    live = np.fromiter(Movie.objects.values_list("id", flat=True), dtype=np.int64)
+    pairs = pairs[np.isin(pairs[:, 1], live)]
+
+    movie_ids, neighbour_ids, scores, ranks = similarities(pairs, k, min_common)
+
+    with transaction.atomic():
+        MovieRecommendation.objects.all().delete()
+        MovieRecommendation.objects.bulk_create(
+            [
+                MovieRecommendation(
+                    movie_id=int(movie_id),
+                    recommended_id=int(neighbour_id),
+                    score=float(score),
+                    rank=int(rank) + 1,
+                )
+                for movie_id, neighbour_id, score, rank in zip(movie_ids, neighbour_ids, scores, ranks)
+            ],
+            batch_size=1000,
+        )
+
+    return {
+        "pairs": len(pairs),
+        "users": len(np.unique(pairs[:, 0])),
+        "movies": len(np.unique(pairs[:, 1])),
+        "recommendations": len(movie_ids),
+    }
+
+
+# =========================
+# SERVING
+# =========================
+def similar_movies(movie, limit=4):
+    return [
+        rec.recommended
+        for rec in movie.recommendations.select_related("recommended")[:limit]
+    ]
+
+
+def booked_movie_ids(user):
+    """Movies the user has ever booked (cached for a few minutes)."""
+    key = f"booked_movies:{user.id}"
+    ids = cache.get(key)
+    if ids is None:
+        ids = set().union(*fan_out(lambda alias: set(
+            Booking.objects.using(alias).filter(user_id=user.id).values_list("movie_id", flat=True)
+        )))
+        ids |= set(BookingHistory.objects.filter(user_id=user.id).values_list("movie_id", flat=True))
+        cache.set(key, ids, timeout=300)
+    return ids
+
+
+def recommended_for(user, limit=4):
+    """
+    Movies closest to everything the user has booked (summed similarity),
+    leaving out ones they already booked.  Empty for new/anonymous users.
+    """
+    if not user.is_authenticated:
+        return []
+    booked = booked_movie_ids(user)
+    if not booked:
+        return []
+
+    ranked = list(
+        MovieRecommendation.objects
+        .filter(movie_id__in=booked)
+        .exclude(recommended_id__in=booked)
+        .values("recommended_id")
+        .annotate(total=Sum("score"))
+        .order_by("-total", "recommended_id")
+        .values_list("recommended_id", flat=True)[:limit]
+    )
+    movies = Movie.objects.in_bulk(ranked)
+    return [movies[movie_id] for movie_id in ranked if movie_id in movies]
@@ -0,0 +1,204 @@
+"""
+Seat inventory sharding.
+
+Every theater's ``Seat``, ``Booking`` and ``BookingEvent`` rows live
+together on one of ``settings.SEAT_SHARDS`` (database aliases).
+``Theater.shard`` records where; blank means ``"default"``, which is where everything lived before
+sharding.  Movies, theaters and users stay on ``default``.
+
+Code that touches seats or bookings for one show goes through the
+theater (``theater.seats``, ``theater.booking_set``, or ``using=
+shard_of(theater)`` for transactions); the router then sends it to the
+right database.  Per-user and site-wide reads use ``fan_out``, and also read
+``BookingHistory`` (archived shows, on default) so callers see every
+booking ever made.
+"""
+import random
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, Q, Sum
+
+SHARDED_MODELS = {"movies.seat", "movies.booking", "movies.bookingevent"}
+PLACEMENT_CACHE_SECONDS = 300
+
+
+def shard_aliases():
+    return list(getattr(settings, "SEAT_SHARDS", None) or ["default"])
+
+
+def choose_shard():
+    """Placement for a new theater."""
+    return random.choice(shard_aliases())
+
+
+def placement_key(theater_id):
+    return f"theater_shard:{theater_id}"
+
+
+def shard_of(theater):
+    """Alias holding a theater's seats; accepts a Theater or its id."""
+    from .models import Theater
+
+    if isinstance(theater, Theater):
+        return theater.shard or "default"
+
+    key = placement_key(theater)
+    shard = cache.get(key)
+    if shard is None:
+        shard = (
+            Theater.objects.using("default")
+            .filter(id=theater)
+            .values_list("shard", flat=True)
+            .first()
+        ) or "default"
+        cache.set(key, shard, timeout=PLACEMENT_CACHE_SECONDS)
+    return shard
+
+
+def forget_placement(theater_id):
+    cache.delete(placement_key(theater_id))
+
+
+def shard_of_instance(instance):
+    """Alias for a Seat, Booking or Theater instance, if we can tell."""
+    label = instance._meta.label_lower
+    if label == "movies.theater":
+        return shard_of(instance)
+    if label in SHARDED_MODELS and instance.theater_id is not None:
+        cached = instance._state.fields_cache.get("theater")
+        return shard_of(cached if cached is not None else instance.theater_id)
+    return None
+
+
+def reporting_aliases():
+    """Shards to read for reports, using a replica for ``default`` if any."""
+    from booktheticket.routers import read_db
+
+    return [read_db() if alias == "default" else alias for alias in shard_aliases()]
+
+
+def fan_out(fn, aliases=None):
+    """Run ``fn(alias)`` on every shard, in parallel when there are several."""
+    aliases = aliases or shard_aliases()
+    if len(aliases) == 1:
+        return [fn(aliases[0])]
+
+    def run(alias):
+        try:
+            return fn(alias)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=len(aliases)) as pool:
+        return list(pool.map(run, aliases))
+
+
+# =========================
+# CROSS-SHARD READS
+# =========================
+def seat_counts(theaters, now):
+    """
+    ``{theater_id: (total, booked, held)}`` with one GROUP BY query per
+    shard involved, however many shows there are.
+    """
+    by_shard = {}
+    for theater in theaters:
+        by_shard.setdefault(shard_of(theater), []).append(theater.id)
+
+    def count(alias):
+        from .models import Seat
+
+        return list(
+            Seat.objects.using(alias)
+            .filter(theater_id__in=by_shard[alias])
+            .values("theater_id")
+            .annotate(
+                total=Count("id"),
+                booked=Count("id", filter=Q(is_booked=True)),
+                held=Count("id", filter=Q(is_booked=False, reserved_until__gt=now)),
+            )
+        )
+
+    counts = {}
+    for rows in fan_out(count, list(by_shard)) if by_shard else []:
+        for row in rows:
+            counts[row["theater_id"]] = (row["total"], row["booked"], row["held"])
+    return counts
+
+
+def attach_catalog(bookings):
+    """Fill in movie, theater and user on bookings read from shards."""
+    from django.contrib.auth.models import User
+
+    from .models import Movie, Theater
+
+    movies = Movie.objects.in_bulk({b.movie_id for b in bookings})
+    theaters = Theater.objects.in_bulk({b.theater_id for b in bookings})
+    users = User.objects.in_bulk({b.user_id for b in bookings})
+
+    for booking in bookings:
+        booking.movie = movies.get(booking.movie_id)
+        booking.theater = theaters.get(booking.theater_id)
+        booking.user = users.get(booking.user_id)
+    return bookings
+
+
+def user_bookings(user):
+    """All of a user's bookings across shards and history, newest first."""
+    from .models import Booking, BookingHistory
+
+    bookings = [
+        booking
+        for shard in fan_out(
+            lambda alias: list(
+                Booking.objects.using(alias).filter(user_id=user.id).select_related("seat")
+            )
+        )
+        for booking in shard
+    ]
+    bookings.extend(BookingHistory.objects.filter(user_id=user.id))
+    bookings.sort(key=lambda b: b.booked_at, reverse=True)
+    return attach_catalog(bookings)
+
+
+def booking_stats(recent=10):
+    """
+    Totals (bookings and revenue), per-movie/per-theater counts and the
+    latest bookings, site-wide (live shards plus archived history).
+    """
+    from booktheticket.routers import read_db
+
+    from .models import Booking, BookingHistory
+
+    def stats(bookings):
+        totals = bookings.aggregate(total=Count("id"), revenue=Sum("amount"))
+        return {
+            "total": totals["total"],
+            "revenue": totals["revenue"] or 0,
+            "movies": Counter(dict(
+                bookings.values("movie_id").annotate(n=Count("id")).values_list("movie_id", "n")
+            )),
+            "theaters": Counter(dict(
+                bookings.values("theater_id").annotate(n=Count("id")).values_list("theater_id", "n")
+            )),
+            "recent": list(bookings.order_by("-booked_at")[:recent]),
+        }
+
+    shards = fan_out(lambda alias: stats(Booking.objects.using(alias)), reporting_aliases())
+    history = stats(BookingHistory.objects.using(read_db()))
+
+    merged = {"total": 0, "revenue": 0, "movies": Counter(), "theaters": Counter(), "recent": []}
+    for shard in [*shards, history]:
+        merged["total"] += shard["total"]
+        merged["revenue"] += shard["revenue"]
+        merged["movies"].update(shard["movies"])
+        merged["theaters"].update(shard["theaters"])
+        merged["recent"].extend(shard["recent"])
+
+    merged["recent"].sort(key=lambda b: b.booked_at, reverse=True)
+    merged["recent"] = attach_catalog(merged["recent"][:recent])
+    return merged
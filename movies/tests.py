@@ -1,3 +1,1786 @@
-from django.test import TestCase
+import os
+import re
+import tempfile
+from contextlib import ExitStack, contextmanager
+from datetime import time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.db.models import Count, F, Q
+from django.db.utils import ConnectionHandler
+from django.db.models.query import QuerySet
+from django.http import Http404, HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from booktheticket.routers import (
+    PIN_COOKIE,
+    PrimaryPinningMiddleware,
+    PrimaryReplicaRouter,
+    SeatShardRouter,
+    _pinned,
+    read_db,
+)
+from booktheticket.warmup import warm_code, warm_worker
+
+from .allocator import allocate_best, find_best, load_rows, parse_seat_number, runs_of
+from .events import read_events
+from .holds import HOLD_DURATION, book_held_seats, hold_seats, release_expired
+from .images import VARIANT_DIR, VARIANT_WIDTHS, render_variants, srcset, store_variants
+from .media import serve_media
+from .models import Booking, BookingEvent, BookingHistory, Movie, Seat, ShowPrice, Theater
+from .pricing import price_key, price_table
+from .ratelimit import client_ip, hit, parse_rate, ratelimit
+from .recommendations import similarities
+from .shards import booking_stats, placement_key, seat_counts, shard_aliases, shard_of, user_bookings
+from .waiting_room import WaitingRoom, WaitingRoomBusy
+
+SHOWS = 60
+ROWS = "ABCDEFGHIJ"
+SEATS_PER_ROW = 20
+USERS = 200
+
+
+class DatabaseTestCase(TestCase):
+    """
+    TestCase over the primary and every seat shard.
+
+    Replica test mirrors are separate connections and can't see rows a
+    TestCase hasn't committed (SQLite even reports the table locked), so
+    they are left out and catalog reads are pinned to the primary, as
+    they are for a request right after a write.  ``ReplicaRoutingTests``
+    covers the replicas.
+    """
+    databases = {"default", *shard_aliases()}
+
+    @classmethod
+    def setUpClass(cls):
+        cls._pinned_token = _pinned.set(True)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        _pinned.reset(cls._pinned_token)
+
+
+def make_show(seat_numbers=("A1", "A2", "A3", "A4"), name="Test movie", shard="", **seat_fields):
+    """A movie with one show today and free seats on the show's shard."""
+    # No image: Movie.save() would try to build poster variants
+    movie = Movie.objects.create(
+        name=name, rating=7, cast="", description="", genre="Drama", language="English",
+    )
+    theater = Theater.objects.create(
+        name="Screen 1", movie=movie, date=timezone.localdate(), time=time(18), shard=shard,
+    )
+    Seat.objects.using(shard_of(theater)).bulk_create([
+        Seat(theater=theater, seat_number=number, time=theater.time, **seat_fields)
+        for number in seat_numbers
+    ])
+    return theater, {seat.seat_number: seat for seat in theater.seats.all()}
+
+
+class HotQueryPlanTests(DatabaseTestCase):
+    """
+    ``EXPLAIN`` the queries behind the seat page, holds, the expiry sweep,
+    theater_list, profile and the dashboard on a seeded dataset, and fail
+    if any of them stops using an index (SQLite ``SCAN`` without an index,
+    PostgreSQL ``Seq Scan``).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        today = timezone.localdate()
+
+        User.objects.bulk_create([User(username=f"plan-{n}") for n in range(USERS)])
+        cls.users = list(User.objects.filter(username__startswith="plan-"))
+        # bulk_create skips Movie.save(), i.e. building poster variants
+        Movie.objects.bulk_create([
+            Movie(
+                name=f"Plan {n}", image="movies/plan.jpg", rating=5, cast="",
+                description="", genre="Drama", language="English",
+            )
+            for n in range(3)
+        ])
+        cls.movies = list(Movie.objects.filter(name__startswith="Plan ").order_by("id"))
+        Theater.objects.bulk_create([
+            Theater(
+                name=f"Screen {n % 6}",
+                movie=cls.movies[n % len(cls.movies)],
+                date=today + timedelta(days=n // 6),
+                time=time(10 + n % 6 * 2),
+            )
+            for n in range(SHOWS)
+        ])
+        cls.theaters = list(Theater.objects.order_by("id"))
+
+        # The rest of the catalog: past shows and movies nobody is booking,
+        # so looking the busy ones up by id is as selective as in production.
+        Movie.objects.bulk_create([
+            Movie(
+                name=f"Catalog {n}", image="movies/plan.jpg", rating=5, cast="",
+                description="", genre="Drama", language="English",
+            )
+            for n in range(200)
+        ])
+        Theater.objects.bulk_create([
+            Theater(
+                name=f"Screen {n % 6}",
+                movie=cls.movies[n % len(cls.movies)],
+                date=today - timedelta(days=1 + n // 6),
+                time=time(10 + n % 6 * 2),
+            )
+            for n in range(1000)
+        ])
+
+        Seat.objects.bulk_create([
+            Seat(
+                theater=theater,
+                seat_number=f"{row}{number}",
+                time=theater.time,
+                is_booked=number <= 5,
+                # A few live and lapsed holds for the expiry sweep
+                reserved_by=cls.users[number] if number in (6, 7) else None,
+                reserved_until=now + timedelta(minutes=number - 7) if number in (6, 7) else None,
+            )
+            for theater in cls.theaters
+            for row in ROWS
+            for number in range(1, SEATS_PER_ROW + 1)
+        ])
+
+        booked = Seat.objects.filter(is_booked=True).values_list("id", "theater_id")
+        movie_of = {t.id: t.movie_id for t in cls.theaters}
+        Booking.objects.bulk_create([
+            Booking(
+                user=cls.users[n % USERS],
+                seat_id=seat_id,
+                theater_id=theater_id,
+                movie_id=movie_of[theater_id],
+            )
+            for n, (seat_id, theater_id) in enumerate(booked)
+        ])
+        BookingHistory.objects.bulk_create([
+            BookingHistory(
+                user=cls.users[n % USERS],
+                movie=cls.movies[0],
+                theater=cls.theaters[0],
+                seat_number=f"Z{n}",
+                booked_at=now - timedelta(days=90),
+            )
+            for n in range(2000)
+        ])
+
+        for alias in cls.databases:
+            with connections[alias].cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    def assertUsesIndex(self, queryset, ordered=False):
+        """
+        No full table scans; with ``ordered``, rows must also come out of
+        the index already in ORDER BY order (no separate sort).
+        """
+        self.assertPlanUsesIndex(queryset.explain(), connections[queryset.db].vendor, ordered)
+
+    def assertPlanUsesIndex(self, plan, vendor, ordered=False):
+        if vendor == "postgresql":
+            scans = re.findall(r"Seq Scan on \w+", plan)
+            sorts = re.findall(r"Sort Key: .*", plan)
+        elif vendor == "sqlite":
+            # "SCAN movies_seat" is a full table scan; "SCAN ... USING
+            # [COVERING] INDEX" walks an index, "SEARCH" looks rows up.
+            scans = [
+                line for line in plan.splitlines()
+                if re.search(r"\bSCAN\b", line) and "INDEX" not in line
+            ]
+            sorts = re.findall(r"USE TEMP B-TREE FOR .*ORDER BY", plan)
+        else:
+            self.skipTest(f"no plan check for {vendor}")
+
+        self.assertFalse(scans, f"sequential scan in plan:\n{plan}")
+        if ordered:
+            self.assertFalse(sorts, f"sort instead of an ordered index in plan:\n{plan}")
+
+    def captured(self, fn):
+        """``(alias, sql)`` of every SELECT/UPDATE/DELETE ``fn()`` sends."""
+        with ExitStack() as stack:
+            contexts = {
+                alias: stack.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in sorted(self.databases)
+            }
+            # fan_out's threads would read outside the test transaction
+            with mock.patch(
+                "movies.shards.fan_out",
+                lambda fn, aliases=None: [fn(alias) for alias in aliases or shard_aliases()],
+            ):
+                fn()
+
+        return [
+            (alias, query["sql"])
+            for alias, context in contexts.items()
+            for query in context.captured_queries
+            if query["sql"].lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE"))
+        ]
+
+    def assertQueriesUseIndexes(self, fn, exempt=None):
+        """EXPLAIN what ``fn()`` actually ran, as it ran it."""
+        queries = self.captured(fn)
+        self.assertTrue(queries)
+        for alias, sql in queries:
+            if exempt and exempt(sql):
+                continue
+            connection = connections[alias]
+            with connection.cursor() as cursor:
+                if connection.vendor == "sqlite":
+                    cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                    plan = "\n".join(row[-1] for row in cursor.fetchall())
+                else:
+                    cursor.execute(f"EXPLAIN {sql}")
+                    plan = "\n".join(row[0] for row in cursor.fetchall())
+            with self.subTest(sql=sql):
+                self.assertPlanUsesIndex(plan, connection.vendor)
+
+    # 💺 Seat page and holds
+    def test_seat_map(self):
+        self.assertUsesIndex(self.theaters[5].seats.all())
+
+    def test_available_seats(self):
+        now = timezone.now()
+        self.assertUsesIndex(
+            self.theaters[5].seats.filter(is_booked=False).filter(
+                Q(reserved_until__isnull=True) | Q(reserved_until__lte=now)
+            )
+        )
+
+    def test_seats_left_counts(self):
+        now = timezone.now()
+        self.assertUsesIndex(
+            Seat.objects.filter(theater_id__in=[t.id for t in self.theaters[:6]])
+            .values("theater_id")
+            .annotate(
+                total=Count("id"),
+                booked=Count("id", filter=Q(is_booked=True)),
+                held=Count("id", filter=Q(is_booked=False, reserved_until__gt=now)),
+            )
+        )
+
+    def test_expiry_sweep(self):
+        self.assertQueriesUseIndexes(release_expired)
+
+    def test_expiry_sweep_one_show(self):
+        self.assertQueriesUseIndexes(lambda: release_expired(self.theaters[0]))
+
+    # 🎬 Listings
+    def test_theater_list(self):
+        self.assertUsesIndex(
+            Theater.objects.filter(movie=self.movies[1])
+            .exclude(date__lt=timezone.localdate())
+            .order_by(F("date").asc(nulls_first=True), "time", "name")
+        )
+
+    # 👤 Profile
+    def test_user_bookings(self):
+        self.assertQueriesUseIndexes(lambda: user_bookings(self.users[7]))
+
+    # 📊 Dashboard
+    def test_booking_stats(self):
+        if connection.vendor != "sqlite":
+            # Whole-table aggregates; PostgreSQL rightly prefers a seq scan.
+            self.skipTest("full-table aggregate")
+        # Site-wide totals have to read every row; the rest must not.
+        self.assertQueriesUseIndexes(
+            booking_stats,
+            exempt=lambda sql: not re.search(r"\b(WHERE|GROUP BY|ORDER BY)\b", sql),
+        )
+
+
+# =========================
+# WAITING ROOM
+# =========================
+@override_settings(
+    WAITING_ROOM_MAX_ACTIVE=2,
+    WAITING_ROOM_ADMIT_GRACE_SECONDS=60,
+    WAITING_ROOM_LEASE_SECONDS=600,
+    WAITING_ROOM_AVG_CHECKOUT_SECONDS=180,
+)
+class WaitingRoomTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = LocMemCache("waiting-room-tests", {})
+        self.cache.clear()
+        self.now = 1_000_000.0
+        clock = mock.patch("movies.waiting_room.time.time", side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def room(self, theater_id=1):
+        return WaitingRoom(theater_id, cache_backend=self.cache)
+
+    def test_first_tickets_are_admitted_in_order(self):
+        room = self.room()
+        first, second, third = room.join(), room.join(), room.join()
+
+        self.assertEqual([first.number, second.number, third.number], [1, 2, 3])
+        self.assertTrue(first.admitted and second.admitted)
+        self.assertFalse(third.admitted)
+        self.assertEqual((third.position, third.ahead), (1, 0))
+
+    def test_eta_counts_rounds_of_checkouts(self):
+        room = self.room()
+        tickets = [room.join() for _ in range(7)]
+
+        # Two slots, so tickets 3-4 wait one checkout, 5-6 two, 7 three.
+        self.assertEqual(
+            [(t.position, t.ahead, t.eta_seconds) for t in tickets[2:]],
+            [(1, 0, 180), (2, 1, 180), (3, 2, 360), (4, 3, 360), (5, 4, 540)],
+        )
+
+    def test_release_admits_next_ticket(self):
+        room = self.room()
+        first, _, third, fourth = [room.join() for _ in range(4)]
+
+        room.release(first.number)
+
+        self.assertIsNone(room.status(first.number))
+        self.assertTrue(room.status(third.number).admitted)
+        self.assertEqual(room.status(fourth.number).position, 1)
+
+    def test_unused_admission_expires_after_grace(self):
+        room = self.room()
+        first, second, third = room.join(), room.join(), room.join()
+        room.touch(second.number)
+
+        self.now += 61  # first never showed up; second is on the seat page
+        self.assertIsNone(room.status(first.number))
+        self.assertTrue(room.status(second.number).admitted)
+        self.assertTrue(room.status(third.number).admitted)
+
+        self.now += 600
+        self.assertIsNone(room.status(second.number))
+
+    def test_touch_only_extends_admitted_tickets(self):
+        room = self.room()
+        tickets = [room.join() for _ in range(3)]
+
+        self.assertTrue(room.touch(tickets[0].number))
+        self.assertFalse(room.touch(tickets[2].number))
+
+    def test_theaters_have_separate_queues(self):
+        self.room(1).join()
+        self.room(1).join()
+        self.assertTrue(self.room(2).join().admitted)
+
+    def test_busy_lock_fails_instead_of_proceeding(self):
+        room = self.room()
+        self.cache.add(room.lock_key, 1, timeout=5)
+
+        with mock.patch("movies.waiting_room.time.monotonic", side_effect=[0, 0, 3]), \
+                mock.patch("movies.waiting_room.time.sleep"):
+            with self.assertRaises(WaitingRoomBusy):
+                room.join()
+        self.assertIsNone(self.cache.get(room.seq_key))
+
+
+# =========================
+# RATE LIMITING
+# =========================
+@override_settings(RATELIMIT_ENABLED=True, RATELIMITS={}, RATELIMIT_PROXY_HOPS=1)
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def request(self, forwarded=None, remote="10.0.0.1"):
+        headers = {"HTTP_X_FORWARDED_FOR": forwarded} if forwarded is not None else {}
+        return self.factory.get("/", REMOTE_ADDR=remote, **headers)
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("10/m"), (10, 60))
+        self.assertEqual(parse_rate("5/30s"), (5, 30))
+        self.assertEqual(parse_rate("100/h"), (100, 3600))
+        with self.assertRaises(ValueError):
+            parse_rate("10/week")
+
+    # 🌐 Client address
+    def test_client_ip_takes_the_entry_our_proxy_appended(self):
+        # The client wrote "1.2.3.4"; the proxy appended the real address.
+        self.assertEqual(client_ip(self.request("1.2.3.4, 203.0.113.9")), "203.0.113.9")
+        self.assertEqual(client_ip(self.request("203.0.113.9")), "203.0.113.9")
+
+    def test_spoofed_entries_do_not_change_the_key(self):
+        ips = {client_ip(self.request(f"{n}.0.0.1, 203.0.113.9")) for n in range(1, 20)}
+        self.assertEqual(ips, {"203.0.113.9"})
+
+    @override_settings(RATELIMIT_PROXY_HOPS=2)
+    def test_client_ip_counts_hops_from_the_right(self):
+        self.assertEqual(client_ip(self.request("6.6.6.6, 203.0.113.9, 10.1.1.1")), "203.0.113.9")
+
+    def test_client_ip_falls_back_to_remote_addr(self):
+        self.assertEqual(client_ip(self.request()), "10.0.0.1")
+        self.assertEqual(client_ip(self.request(" , ")), "10.0.0.1")
+        with self.settings(RATELIMIT_PROXY_HOPS=2):
+            self.assertEqual(client_ip(self.request("203.0.113.9")), "10.0.0.1")
+        with self.settings(RATELIMIT_PROXY_HOPS=0):
+            self.assertEqual(client_ip(self.request("203.0.113.9")), "10.0.0.1")
+
+    # 🚦 Decorator
+    def test_over_limit_gets_429_with_retry_after(self):
+        view = ratelimit("2/m", key="ip", methods=None)(lambda request: HttpResponse("ok"))
+
+        statuses = [view(self.request("203.0.113.9")).status_code for _ in range(2)]
+        response = view(self.request("203.0.113.9"))
+
+        self.assertEqual(statuses, [200, 200])
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response["Retry-After"]) <= 61)
+        # Somebody else behind the same proxy is unaffected
+        self.assertEqual(view(self.request("203.0.113.10")).status_code, 200)
+
+    def test_methods_and_overrides(self):
+        view = ratelimit("1/m", key="ip")(lambda request: HttpResponse("ok"))
+        post = self.factory.post("/", REMOTE_ADDR="10.0.0.1")
+
+        self.assertEqual(view(self.request()).status_code, 200)
+        self.assertEqual(view(self.request()).status_code, 200)  # GET isn't limited
+        self.assertEqual(view(post).status_code, 200)
+        self.assertEqual(view(post).status_code, 429)
+        with self.settings(RATELIMITS={"<lambda>:ip": None}):
+            self.assertEqual(view(post).status_code, 200)
+
+    # 📐 Sliding window
+    def test_full_window_blocks_until_it_has_decayed(self):
+        for _ in range(10):
+            self.assertEqual(hit("g", "c", 10, 60, now=6000), (True, 0))
+        allowed, retry_after = hit("g", "c", 10, 60, now=6030)
+        # 30 s to the next window, where the full window still weighs 10
+        self.assertEqual((allowed, retry_after), (False, 31))
+        self.assertFalse(hit("g", "c", 10, 60, now=6060)[0])
+        self.assertTrue(hit("g", "c", 10, 60, now=6030 + retry_after)[0])
+
+    def test_previous_window_is_weighted_by_overlap(self):
+        for _ in range(10):
+            hit("g", "c", 10, 60, now=6000)
+
+        # 15 s into the next window the previous one still counts 10 * 45/60 = 7.5
+        results = [hit("g", "c", 10, 60, now=6075) for _ in range(4)]
+        self.assertEqual([allowed for allowed, _ in results], [True, True, True, False])
+        # 7.5 + 3 >= 10 until 10 * (60 - e) / 60 + 3 < 10, i.e. e > 18
+        self.assertEqual(results[-1][1], 4)
+        self.assertFalse(hit("g", "c", 10, 60, now=6078)[0])
+        self.assertTrue(hit("g", "c", 10, 60, now=6079)[0])
+
+    def test_retry_after_is_always_enough(self):
+        # Bursts that spill into a second window at different offsets
+        for start in range(6000, 6060, 7):
+            for step in (0.5, 2, 9):
+                cache.clear()
+                now = start
+                while True:
+                    allowed, retry_after = hit("g", "c", 5, 60, now=now)
+                    if not allowed:
+                        break
+                    now += step
+                # Rejected hits aren't counted, so probe the earlier time first
+                self.assertFalse(hit("g", "c", 5, 60, now=now + retry_after - 1.5)[0], (start, step))
+                self.assertTrue(hit("g", "c", 5, 60, now=now + retry_after)[0], (start, step))
+
+
+# =========================
+# SEAT HOLDS (both SEAT_LOCKING modes)
+# =========================
+class SeatHoldTestsMixin:
+    mode = None
+
+    def setUp(self):
+        self.theater, self.seats = make_show()
+        self.user = User.objects.create(username="holder")
+        self.rival = User.objects.create(username="rival")
+
+    def ids(self, *numbers):
+        return [self.seats[number].id for number in numbers]
+
+    def reload(self, number):
+        return self.theater.seats.get(id=self.seats[number].id)
+
+    def hold(self, user, *numbers, versions=None):
+        return hold_seats(self.theater, user, self.ids(*numbers), versions, mode=self.mode)
+
+    def hold_events(self, user):
+        return BookingEvent.objects.using(shard_of(self.theater)).filter(
+            kind=BookingEvent.HOLD, user_id=user.id
+        )
+
+    def test_hold_free_seats(self):
+        result = self.hold(self.user, "A1", "A2")
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.held, self.ids("A1", "A2"))
+        for number in ("A1", "A2"):
+            seat = self.reload(number)
+            self.assertEqual(seat.reserved_by_id, self.user.id)
+            self.assertEqual(seat.version, 1)
+            self.assertEqual(seat.reserved_until, result.reserved_until)
+        self.assertEqual(self.hold_events(self.user).count(), 2)
+
+    def test_hold_without_recording_events(self):
+        result = hold_seats(self.theater, self.user, self.ids("A1"), mode=self.mode, record_events=False)
+
+        self.assertTrue(result.ok)
+        self.assertEqual(self.reload("A1").reserved_by_id, self.user.id)
+        self.assertFalse(self.hold_events(self.user).exists())
+
+    def test_lost_lists_exactly_the_seats_taken_by_others(self):
+        self.assertTrue(self.hold(self.rival, "A2").ok)
+        self.theater.seats.filter(id__in=self.ids("A4")).update(is_booked=True)
+
+        result = self.hold(self.user, "A1", "A2", "A3", "A4")
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.lost, self.ids("A2", "A4"))
+        self.assertEqual(result.held, [])
+
+    def test_rollback_leaves_nothing_held(self):
+        self.assertTrue(self.hold(self.rival, "A3").ok)
+
+        self.hold(self.user, "A1", "A2", "A3")
+
+        for number in ("A1", "A2"):
+            seat = self.reload(number)
+            self.assertIsNone(seat.reserved_by_id)
+            self.assertEqual(seat.version, 0)
+        self.assertEqual(self.reload("A3").reserved_by_id, self.rival.id)
+        self.assertFalse(self.hold_events(self.user).exists())
+
+    def test_stale_version_is_lost(self):
+        # Somebody held and let go of A1 since this page was rendered
+        self.assertTrue(self.hold(self.rival, "A1").ok)
+        self.theater.seats.filter(id__in=self.ids("A1")).update(
+            reserved_by=None, reserved_until=None, version=F("version") + 1
+        )
+
+        result = self.hold(self.user, "A1", "A2", versions={self.seats["A1"].id: 0})
+        self.assertEqual(result.lost, self.ids("A1"))
+
+        current = {seat_id: 2 for seat_id in self.ids("A1")}
+        self.assertTrue(self.hold(self.user, "A1", "A2", versions=current).ok)
+
+    def test_own_hold_is_extended_and_lapsed_holds_are_free(self):
+        self.assertTrue(self.hold(self.user, "A1").ok)
+        self.assertTrue(self.hold(self.user, "A1").ok)
+        self.assertEqual(self.reload("A1").version, 2)
+
+        self.assertTrue(self.hold(self.rival, "A2").ok)
+        self.theater.seats.filter(id__in=self.ids("A2")).update(
+            reserved_until=timezone.now() - HOLD_DURATION
+        )
+        self.assertTrue(self.hold(self.user, "A2").ok)
+        self.assertEqual(self.reload("A2").reserved_by_id, self.user.id)
+
+
+class PessimisticHoldTests(SeatHoldTestsMixin, DatabaseTestCase):
+    mode = "pessimistic"
+
+
+class OptimisticHoldTests(SeatHoldTestsMixin, DatabaseTestCase):
+    mode = "optimistic"
+
+    def test_conflict_is_detected_by_the_affected_row_count(self):
+        # The rival takes A2 after our UPDATE of A1 and before the one of
+        # A2: nothing was read up front, so only the row count can tell.
+        update = QuerySet.update
+        rival_id = self.rival.id
+        a2 = self.seats["A2"].id
+
+        def racing_update(queryset, **kwargs):
+            if queryset.model is Seat and not raced:
+                raced.append(True)
+                update(
+                    Seat.objects.using(shard_of(self.theater)).filter(id=a2),
+                    reserved_by_id=rival_id,
+                    reserved_until=timezone.now() + HOLD_DURATION,
+                    version=F("version") + 1,
+                )
+            return update(queryset, **kwargs)
+
+        raced = []
+        with mock.patch.object(QuerySet, "update", racing_update):
+            result = self.hold(self.user, "A1", "A2", "A3")
+
+        self.assertEqual(raced, [True])
+        self.assertEqual(result.lost, self.ids("A2"))
+        # (The rival's write shares our connection here, so it is rolled
+        # back with ours; in production it commits on its own.)
+        self.assertIsNone(self.reload("A1").reserved_by_id)
+        self.assertIsNone(self.reload("A3").reserved_by_id)
+        self.assertFalse(self.hold_events(self.user).exists())
+
+
+# =========================
+# PRICING
+# =========================
+@override_settings(DEFAULT_SEAT_PRICES={"standard": 200, "premium": 300, "recliner": 450})
+class PricingTests(DatabaseTestCase):
+    def setUp(self):
+        cache.clear()
+        self.theater, self.seats = make_show(["A1", "A2", "A3"])
+        self.theater.seats.filter(seat_number="A2").update(category="premium")
+        self.theater.seats.filter(seat_number="A3").update(category="recliner")
+        self.premium = ShowPrice.objects.create(theater=self.theater, category="premium", price=350)
+        self.theater.refresh_from_db()
+        self.user = User.objects.create(username="payer")
+
+    def book(self, *numbers):
+        ids = [self.seats[number].id for number in numbers]
+        self.assertTrue(hold_seats(self.theater, self.user, ids).ok)
+        return book_held_seats(self.theater, self.user, ids)
+
+    def amounts(self):
+        bookings = Booking.objects.using(shard_of(self.theater)).filter(user=self.user)
+        return {b.seat.seat_number: b.amount for b in bookings.select_related("seat")}
+
+    def test_seats_are_charged_their_category_price(self):
+        booked = self.book("A1", "A2", "A3")
+
+        expected = {"A1": Decimal(200), "A2": Decimal(350), "A3": Decimal(450)}
+        self.assertEqual({seat.seat_number: seat.price for seat in booked}, expected)
+        self.assertEqual(self.amounts(), expected)
+
+    def test_price_changes_reach_every_process(self):
+        stale_key = price_key(self.theater)
+        self.assertEqual(price_table(self.theater)["premium"], 350)
+
+        self.premium.price = 400
+        self.premium.save()
+        # Nothing is deleted (other processes' caches couldn't be); the
+        # theater's version moves on instead.
+        self.assertEqual(cache.get(stale_key)["premium"], 350)
+        self.theater.refresh_from_db()
+        self.assertEqual(price_table(self.theater)["premium"], 400)
+
+        self.premium.delete()
+        self.theater.refresh_from_db()
+        self.assertEqual(price_table(self.theater)["premium"], 300)
+
+    def test_bookings_keep_what_they_were_charged(self):
+        self.book("A2")
+        self.premium.price = 500
+        self.premium.save()
+
+        self.assertEqual(self.amounts(), {"A2": Decimal(350)})
+
+    def test_dashboard_revenue_sums_the_amounts_charged(self):
+        self.book("A1", "A2", "A3")
+        BookingHistory.objects.create(
+            user=self.user, movie=self.theater.movie, theater=self.theater,
+            seat_number="Z9", amount=Decimal("99.50"), booked_at=timezone.now(),
+        )
+        self.client.force_login(User.objects.create(username="boss", is_staff=True))
+        self.client.cookies[PIN_COOKIE] = str(timezone.now().timestamp() + 60)
+
+        # fan_out's threads would read outside the test transaction
+        with mock.patch(
+            "movies.shards.fan_out",
+            lambda fn, aliases=None: [fn(alias) for alias in aliases or shard_aliases()],
+        ):
+            response = self.client.get(reverse("admin_dashboard"))
+
+        self.assertEqual(response.context["total_bookings"], 4)
+        self.assertEqual(response.context["total_revenue"], Decimal("1099.50"))
+
+
+# =========================
+# SHOWTIMES PAGE
+# =========================
+class TheaterListTests(TransactionTestCase):
+    """Shows spread over the shards; transactional for seat_counts' fan_out."""
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.holder = User.objects.create(username="holder")
+        self.movie = Movie.objects.create(
+            name="Listed", rating=7, cast="", description="", genre="Drama", language="English",
+        )
+        self.today = timezone.localdate()
+        self.shards = iter(shard_aliases() * 5)
+
+        self.add("Old Screen", self.today - timedelta(days=1), 18, {"A1": {}})
+        self.add("Screen A", self.today, 18, {
+            "A1": {"is_booked": True},
+            "A2": {"reserved_by": self.holder, "reserved_until": timezone.now() + HOLD_DURATION},
+            # A lapsed hold counts as free
+            "A3": {"reserved_by": self.holder, "reserved_until": timezone.now() - timedelta(minutes=1)},
+            "A4": {},
+        })
+        self.add("Screen B", self.today, 21, {"A1": {"is_booked": True}, "A2": {"is_booked": True}})
+        self.add("Screen C", self.today + timedelta(days=1), 10, {"A1": {}})
+        self.add("Screen D", None, 12, {"A1": {}, "A2": {}})
+
+    def add(self, name, date, hour, seats):
+        theater = Theater.objects.create(
+            name=name, movie=self.movie, date=date, time=time(hour), shard=next(self.shards),
+        )
+        Seat.objects.using(shard_of(theater)).bulk_create([
+            Seat(theater=theater, seat_number=number, time=theater.time, **fields)
+            for number, fields in seats.items()
+        ])
+
+    def test_showtimes(self):
+        response = self.client.get(reverse("theater_list", args=[self.movie.id]))
+        listed = [
+            (t.name, t.seats_left, t.seats_held, t.sold_out) for t in response.context["theaters"]
+        ]
+
+        # Past shows left out; undated ones first, then by date and time
+        self.assertEqual(listed, [
+            ("Screen D", 2, 0, False),
+            ("Screen A", 2, 1, False),
+            ("Screen B", 0, 0, True),
+            ("Screen C", 1, 0, False),
+        ])
+
+    def test_days_and_seat_labels(self):
+        html = self.client.get(reverse("theater_list", args=[self.movie.id])).content.decode()
+        html = re.sub(r"\s+", " ", html)
+
+        self.assertNotIn("Old Screen", html)
+        positions = [
+            html.index(text) for text in [
+                "Screen D Theatre",
+                self.today.strftime("%a, %d %b %Y"),
+                "Screen A Theatre", "2 seats left · 1 on hold",
+                "Screen B Theatre", "Sold Out", "No seats left",
+                (self.today + timedelta(days=1)).strftime("%a, %d %b %Y"),
+                "Screen C Theatre", "1 seat left",
+            ]
+        ]
+        self.assertEqual(positions, sorted(positions))
+        self.assertEqual(html.count("Sold Out"), 1)
+        self.assertNotIn(reverse("book_seats", args=[Theater.objects.get(name="Screen B").id]), html)
+
+
+# =========================
+# BEST-AVAILABLE ALLOCATION
+# =========================
+class AllocatorTests(DatabaseTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="allocator")
+        self.rival = User.objects.create(username="allocator-rival")
+
+    def block(self, theater, seat_ids):
+        return sorted(
+            theater.seats.filter(id__in=seat_ids).values_list("seat_number", flat=True),
+            key=parse_seat_number,
+        )
+
+    def test_parse_seat_number(self):
+        self.assertEqual(parse_seat_number("b12"), ("B", 12))
+        self.assertEqual(parse_seat_number(" AA-3 "), ("AA", 3))
+        self.assertEqual(parse_seat_number("A0"), ("A", 0))
+        self.assertIsNone(parse_seat_number("Stall"))
+
+    def test_runs_of(self):
+        free = 0b1110111
+        self.assertEqual(runs_of(free, 1), free)
+        self.assertEqual(runs_of(free, 3), 0b0010001)
+        self.assertEqual(runs_of(free, 4), 0)
+
+    def test_seat_zero_is_a_seat(self):
+        theater, _ = make_show(["A0", "A1", "A2", "A3", "Stall"])
+
+        rows = load_rows(theater, self.user)
+
+        self.assertEqual([row.label for row in rows], ["A"])
+        self.assertEqual((rows[0].first, rows[0].last), (0, 3))
+        self.assertEqual(self.block(theater, find_best(rows, 4)), ["A0", "A1", "A2", "A3"])
+
+    def test_picks_the_block_nearest_the_middle(self):
+        theater, seats = make_show([f"{row}{n}" for row in "ABCDE" for n in range(1, 11)])
+
+        self.assertEqual(
+            self.block(theater, find_best(load_rows(theater, self.user), 2)), ["C5", "C6"]
+        )
+
+        # With C's middle gone, the middle of B or D beats the edge of C
+        theater.seats.filter(seat_number__in=["C4", "C5", "C6", "C7"]).update(is_booked=True)
+        best = self.block(theater, find_best(load_rows(theater, self.user), 2))
+        self.assertIn(best, (["B5", "B6"], ["D5", "D6"]))
+
+    def test_other_peoples_holds_are_taken_and_own_are_free(self):
+        theater, _ = make_show(["A1", "A2", "A3", "A4", "A5"])
+        until = timezone.now() + HOLD_DURATION
+        theater.seats.filter(seat_number="A2").update(reserved_by=self.rival, reserved_until=until)
+        theater.seats.filter(seat_number="A4").update(reserved_by=self.user, reserved_until=until)
+
+        rows = load_rows(theater, self.user)
+
+        self.assertEqual(self.block(theater, find_best(rows, 3)), ["A3", "A4", "A5"])
+        self.assertEqual(find_best(rows, 4), [])
+
+    def test_allocate_best_holds_the_block(self):
+        theater, _ = make_show([f"{row}{n}" for row in "ABC" for n in range(1, 10)])
+
+        result = allocate_best(theater, self.user, 3)
+
+        self.assertTrue(result.ok)
+        self.assertEqual(self.block(theater, result.held), ["B4", "B5", "B6"])
+        self.assertEqual(
+            theater.seats.filter(reserved_by=self.user).count(), 3
+        )
+        self.assertFalse(allocate_best(theater, self.rival, 10).ok)
+
+
+# =========================
+# CATALOG
+# =========================
+class CatalogTests(DatabaseTestCase):
+    feed = (
+        "name,language,genre,rating,cast,description,theater,date,time\n"
+        "Imported,Hindi,Comedy,6.5,Someone,Funny,Screen 2,2030-01-01,19:30\n"
+    )
+
+    def setUp(self):
+        cache.clear()
+
+    def import_feed(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write(self.feed)
+        self.addCleanup(os.remove, f.name)
+        out = StringIO()
+        call_command("import_catalog", f.name, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_pages_render_movies_without_a_poster(self):
+        self.import_feed()
+        movie = Movie.objects.get(name="Imported")
+        self.assertFalse(movie.image)
+
+        # Straight after the import, as DatabaseTestCase reads are
+        self.client.cookies[PIN_COOKIE] = str(timezone.now().timestamp() + 60)
+        for url in ["/", reverse("movie_list"), reverse("theater_list", args=[movie.id])]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, "Imported")
+
+    def test_reimporting_a_feed_changes_nothing(self):
+        self.assertIn("movies: 1 created", self.import_feed())
+        output = self.import_feed()
+
+        self.assertIn("movies: 0 created, 0 updated, 1 unchanged", output)
+        self.assertIn("shows: 0 created, 1 unchanged", output)
+        self.assertEqual(Movie.objects.filter(name="Imported").count(), 1)
+        self.assertEqual(Theater.objects.filter(movie__name="Imported").count(), 1)
+
+    @override_settings(DATABASE_REPLICAS=["no-such-replica"])
+    def test_import_reads_its_own_writes_from_the_primary(self):
+        # A replica read (of ids it just inserted) would fail outright here.
+        token = _pinned.set(False)
+        self.addCleanup(_pinned.reset, token)
+        self.feed = (
+            "name,language,genre,rating,cast,description,theater,date,time,layout\n"
+            "Imported,Hindi,Comedy,6.5,Someone,Funny,Screen 2,2030-01-01,19:30,2x3\n"
+        )
+
+        output = self.import_feed()
+
+        self.assertIn("shows: 1 created", output)
+        theater = Theater.objects.get(movie__name="Imported")
+        self.assertEqual(theater.seats.count(), 6)
+
+    def test_movies_and_shows_are_unique(self):
+        theater, _ = make_show()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Movie.objects.create(
+                name="Test movie", rating=7, cast="", description="", genre="Drama", language="English",
+            )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Theater.objects.create(name="Screen 1", movie=theater.movie, date=theater.date, time=theater.time)
+
+
+# =========================
+# RECOMMENDATIONS
+# =========================
+class SimilarityTests(SimpleTestCase):
+    # user 1 and 2 booked 10 and 20, user 3 booked 10 and 30, user 4 only 40
+    pairs = np.array([[1, 10], [1, 20], [2, 10], [2, 20], [3, 10], [3, 30], [4, 40]])
+
+    def neighbours(self, pairs, k, min_common=1):
+        movie_ids, neighbour_ids, scores, ranks = similarities(pairs, k, min_common)
+        result = {}
+        for movie_id, neighbour_id, score, rank in zip(movie_ids, neighbour_ids, scores, ranks):
+            result.setdefault(int(movie_id), []).append((int(neighbour_id), round(float(score), 6)))
+            self.assertEqual(rank, len(result[int(movie_id)]) - 1)
+        return result
+
+    def test_cosine_of_co_bookings(self):
+        self.assertEqual(self.neighbours(self.pairs, k=8), {
+            10: [(20, round(2 / 6 ** 0.5, 6)), (30, round(1 / 3 ** 0.5, 6))],
+            20: [(10, round(2 / 6 ** 0.5, 6))],
+            30: [(10, round(1 / 3 ** 0.5, 6))],
+        })
+
+    def test_top_k_and_min_common(self):
+        self.assertEqual(self.neighbours(self.pairs, k=1)[10], [(20, round(2 / 6 ** 0.5, 6))])
+        self.assertEqual(set(self.neighbours(self.pairs, k=8, min_common=2)), {10, 20})
+
+    def test_ties_go_to_the_lower_id(self):
+        pairs = np.array([[1, 50], [1, 70], [1, 60]])
+        self.assertEqual([n for n, _ in self.neighbours(pairs, k=8)[50]], [60, 70])
+
+    def test_no_bookings(self):
+        self.assertEqual([len(a) for a in similarities(np.empty((0, 2), dtype=np.int64), 8)], [0, 0, 0, 0])
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(7)
+        pairs = np.unique(np.column_stack([rng.integers(0, 60, 600), rng.integers(0, 25, 600)]), axis=0)
+        bookers = {}
+        for user, movie in pairs.tolist():
+            bookers.setdefault(movie, set()).add(user)
+
+        expected = {}
+        for movie, users in bookers.items():
+            scored = [
+                (-len(users & others) / (len(users) * len(others)) ** 0.5, other)
+                for other, others in bookers.items()
+                if other != movie and users & others
+            ]
+            if scored:
+                expected[movie] = [(other, round(-score, 6)) for score, other in sorted(scored)[:5]]
+
+        self.assertEqual(self.neighbours(pairs, k=5), expected)
+
+
+# =========================
+# POSTER VARIANTS
+# =========================
+def png(width=800, height=400):
+    from PIL import Image
+
+    out = BytesIO()
+    Image.linear_gradient("L").resize((width, height)).convert("RGB").save(out, "PNG")
+    return out.getvalue()
+
+
+class PosterVariantTestsMixin:
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = self.settings(MEDIA_ROOT=media_root.name, MEDIA_URL="/media/")
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def stored(self):
+        return sorted(default_storage.listdir(VARIANT_DIR)[1])
+
+
+class PosterVariantTests(PosterVariantTestsMixin, SimpleTestCase):
+    def test_render_sizes_and_formats(self):
+        from PIL import Image
+
+        rendered = render_variants(png(), widths=(320, 160, 1000))
+
+        self.assertEqual(
+            [(fmt, width) for fmt, width, _ in rendered],
+            # Never upscaled: 1000 becomes the original 800
+            [("jpeg", 160), ("webp", 160), ("jpeg", 320), ("webp", 320), ("jpeg", 800), ("webp", 800)],
+        )
+        for fmt, width, content in rendered:
+            with Image.open(BytesIO(content)) as image:
+                self.assertEqual(image.format, {"jpeg": "JPEG", "webp": "WEBP"}[fmt])
+                self.assertEqual(image.size, (width, width // 2))
+
+    def test_names_are_stable_across_runs(self):
+        first = store_variants("movies/poster.png", render_variants(png(), widths=(160, 320)))
+        files = self.stored()
+        second = store_variants("movies/poster.png", render_variants(png(), widths=(160, 320)))
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.stored(), files)  # nothing stored twice
+        self.assertEqual(len(files), 4)
+        self.assertEqual(first["source"], "movies/poster.png")
+        self.assertRegex(first["webp"]["160"], r"^movies/variants/poster\.160w\.[0-9a-f]{12}\.webp$")
+
+        # Different bytes, different name
+        other = store_variants("movies/poster.png", render_variants(png(800, 600), widths=(160,)))
+        self.assertNotEqual(other["jpeg"]["160"], first["jpeg"]["160"])
+
+    def test_srcset(self):
+        manifest = {"jpeg": {"1000": "movies/variants/a.1000w.jpg", "320": "movies/variants/a.320w.jpg"}}
+        self.assertEqual(
+            srcset(manifest, "jpeg"),
+            "/media/movies/variants/a.320w.jpg 320w, /media/movies/variants/a.1000w.jpg 1000w",
+        )
+        self.assertEqual(srcset(manifest, "webp"), "")
+
+
+class PosterBackfillTests(PosterVariantTestsMixin, DatabaseTestCase):
+    def add_movie(self, name, **fields):
+        # bulk_create skips Movie.save(), like rows from before variants existed
+        default_storage.save(f"movies/{name}.png", ContentFile(png()))
+        Movie.objects.bulk_create([Movie(
+            name=name, image=f"movies/{name}.png", rating=7, cast="", description="",
+            genre="Drama", language="English", **fields,
+        )])
+        return Movie.objects.get(name=name)
+
+    def backfill(self):
+        out = StringIO()
+        call_command("build_poster_variants", "--workers", "1", stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_saving_a_new_poster_builds_variants(self):
+        movie = self.add_movie("saved")
+        movie.save()
+
+        movie.refresh_from_db()
+        self.assertEqual(movie.image_variants["source"], "movies/saved.png")
+        self.assertEqual(set(movie.image_variants["jpeg"]), {str(w) for w in VARIANT_WIDTHS})
+        middle = sorted(VARIANT_WIDTHS)[len(VARIANT_WIDTHS) // 2]
+        self.assertEqual(movie.poster_url, default_storage.url(movie.image_variants["jpeg"][str(middle)]))
+
+    def test_backfill_skips_current_variants(self):
+        current = self.add_movie("current")
+        current.save()
+        stale = self.add_movie("stale")
+        before = current.image_variants
+
+        self.assertIn("built variants for 1 posters (0 failed)", self.backfill())
+        stale.refresh_from_db()
+        current.refresh_from_db()
+        self.assertEqual(stale.image_variants["source"], "movies/stale.png")
+        self.assertEqual(current.image_variants, before)
+
+        self.assertIn("All posters already have variants", self.backfill())
+
+
+# =========================
+# CACHED TEMPLATE FRAGMENTS
+# =========================
+@override_settings(DEFAULT_SEAT_PRICES={"standard": 200, "premium": 300})
+class FragmentCacheTests(DatabaseTestCase):
+    """
+    A plain ``.update()`` doesn't touch ``updated_at``, so it shows the
+    fragment is really cached; ``save()`` moves the key on.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.theater, _ = make_show(name="Fragment")
+        self.movie = self.theater.movie
+        self.client.force_login(User.objects.create(username="fragments"))
+        self.client.cookies[PIN_COOKIE] = str(timezone.now().timestamp() + 60)
+
+    def page(self, url):
+        return re.sub(r"\s+", " ", self.client.get(url).content.decode())
+
+    def test_movie_card_follows_movie_updated_at(self):
+        url = reverse("movie_list")
+        self.assertIn('movie-title">Fragment<', self.page(url))
+
+        Movie.objects.filter(id=self.movie.id).update(name="Sneaky")
+        self.assertIn('movie-title">Fragment<', self.page(url))
+
+        self.movie.refresh_from_db()
+        self.movie.name = "Renamed"
+        self.movie.save()
+        self.assertIn('movie-title">Renamed<', self.page(url))
+
+    def test_seat_header_follows_theater_movie_and_seat_count(self):
+        url = reverse("book_seats", args=[self.theater.id])
+        self.assertIn("Screen 1 •", self.page(url))
+
+        Theater.objects.filter(id=self.theater.id).update(name="Sneaky")
+        self.assertIn("Screen 1 •", self.page(url))
+
+        self.theater.refresh_from_db()
+        self.theater.name = "Screen 9"
+        self.theater.save()
+        self.assertIn("Screen 9 •", self.page(url))
+
+        self.movie.name = "Renamed"
+        self.movie.save()
+        self.assertIn(">Renamed</h4>", self.page(url))
+
+        Seat.objects.using(shard_of(self.theater)).create(
+            theater=self.theater, seat_number="A5", time=self.theater.time
+        )
+        self.assertIn("5 Seats", self.page(url))
+
+    def test_seat_legend_follows_prices(self):
+        url = reverse("book_seats", args=[self.theater.id])
+        self.assertIn("Premium ₹300", self.page(url))
+
+        ShowPrice.objects.create(theater=self.theater, category="premium", price=350)
+        self.assertIn("Premium ₹350", self.page(url))
+
+
+# =========================
+# CACHE WARMING
+# =========================
+class WarmCacheTests(TransactionTestCase):
+    """Transactional: the command renders from a thread pool."""
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.theater, _ = make_show(name="Warmed")
+        self.later = Theater.objects.create(
+            name="Screen 2", movie=self.theater.movie, date=self.theater.date, time=time(21),
+        )
+        Seat.objects.using(shard_of(self.later)).create(theater=self.later, seat_number="A1", time=self.later.time)
+
+    def warm(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command("warm_cache", "--movie", str(self.theater.movie_id), *args, stdout=out, stderr=err)
+        return out.getvalue()
+
+    def test_entries_are_in_the_cache(self):
+        output = self.warm()
+
+        movie = Movie.objects.get(id=self.theater.movie_id)
+        for theater, seats in [(Theater.objects.get(id=self.theater.id), 4), (self.later, 1)]:
+            theater.refresh_from_db()
+            self.assertEqual(cache.get(placement_key(theater.id)), shard_of(theater))
+            self.assertEqual(cache.get(price_key(theater)), price_table(theater))
+            self.assertIsNotNone(cache.get(make_template_fragment_key(
+                "seat_header", [theater.id, theater.updated_at, movie.updated_at, seats]
+            )))
+        self.assertIsNotNone(cache.get(make_template_fragment_key("movie_card", [movie.id, movie.updated_at])))
+        self.assertIsNotNone(cache.get(make_template_fragment_key("home_movie_card", [movie.id, movie.updated_at])))
+
+        # 2 placements, 2 price tables, 2 headers + 1 shared legend, 1 card
+        self.assertIn("Warmed 2 shows of 1 movies", output)
+        self.assertRegex(output, r"seat page\s+3/3\s+100.0%")
+        self.assertIn("Cache warm: 100.0% hit ratio", output)
+
+    def test_hit_ratio_counts_what_is_missing(self):
+        # Nothing renders the movie cards this time
+        with mock.patch("movies.management.commands.warm_cache.Command.warm_movie"), \
+                mock.patch("movies.management.commands.warm_cache.Command.warm_catalog"):
+            self.assertIn("Cache warm: 87.5% hit ratio", self.warm("--min-hit-ratio", "0.8"))
+
+            with self.assertRaisesRegex(CommandError, "Only 87.5% of warmed entries"):
+                self.warm()
+
+
+# =========================
+# MEDIA SERVING
+# =========================
+class MediaServingTests(SimpleTestCase):
+    body = bytes(range(256)) * 4  # 1024 bytes
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        os.makedirs(os.path.join(media_root.name, "movies", "variants"))
+        for name in ("movies/poster.jpg", "movies/variants/poster.0123456789ab.jpg"):
+            with open(os.path.join(media_root.name, name), "wb") as f:
+                f.write(self.body)
+
+        settings = self.settings(MEDIA_ROOT=media_root.name, MEDIA_SENDFILE=None, MEDIA_CACHE_MAX_AGE=600)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.factory = RequestFactory()
+
+    def get(self, path="movies/poster.jpg", method="get", **headers):
+        return serve_media(getattr(self.factory, method)(f"/media/{path}", **headers), path)
+
+    def content(self, response):
+        return b"".join(response.streaming_content) if response.streaming else response.content
+
+    def test_full_file_with_validators_and_cache_lifetime(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), self.body)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Cache-Control"], "public, max-age=600")
+        self.assertTrue(response["ETag"] and response["Last-Modified"])
+
+        hashed = self.get("movies/variants/poster.0123456789ab.jpg")
+        self.assertIn("immutable", hashed["Cache-Control"])
+
+    def test_head_sends_no_body(self):
+        response = self.get(method="head")
+        self.assertEqual(response["Content-Length"], "1024")
+        self.assertEqual(response.content, b"")
+
+    # 🔁 304
+    def test_if_none_match_gives_304(self):
+        etag = self.get()["ETag"]
+
+        for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+            response = self.get(HTTP_IF_NONE_MATCH=header)
+            self.assertEqual(response.status_code, 304, header)
+            self.assertEqual(response["ETag"], etag)
+            self.assertNotIn("Accept-Ranges", response)
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_if_modified_since_gives_304(self):
+        last_modified = self.get()["Last-Modified"]
+
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=http_date(0)).status_code, 200)
+
+    # ✂️ 206 / 416
+    def test_byte_ranges(self):
+        for header, (start, end) in [
+            ("bytes=0-99", (0, 99)),
+            ("bytes=1000-", (1000, 1023)),
+            ("bytes=-24", (1000, 1023)),
+            ("bytes=1000-5000", (1000, 1023)),
+        ]:
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(response["Content-Range"], f"bytes {start}-{end}/1024")
+            self.assertEqual(response["Content-Length"], str(end - start + 1))
+            self.assertEqual(self.content(response), self.body[start:end + 1])
+
+    def test_unsatisfiable_range_gives_416(self):
+        for header in ("bytes=1024-", "bytes=2000-3000", "bytes=-0", "bytes=50-10"):
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response["Content-Range"], "bytes */1024")
+
+    def test_ranges_fall_back_to_the_whole_file(self):
+        etag = self.get()["ETag"]
+        # Several ranges, garbage, or a stale If-Range: a plain 200
+        for headers in (
+            {"HTTP_RANGE": "bytes=0-1,5-6"},
+            {"HTTP_RANGE": "pages=1-2"},
+            {"HTTP_RANGE": "bytes=0-9", "HTTP_IF_RANGE": '"stale"'},
+        ):
+            self.assertEqual(self.get(**headers).status_code, 200, headers)
+        self.assertEqual(self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag).status_code, 206)
+
+    # 📤 Handing off to the web server
+    def test_x_accel_redirect(self):
+        with self.settings(MEDIA_SENDFILE="x-accel-redirect", MEDIA_ACCEL_PREFIX="/protected-media/"):
+            response = self.get("movies/variants/poster.0123456789ab.jpg")
+            ranged = self.get(HTTP_RANGE="bytes=0-9")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/protected-media/movies/variants/poster.0123456789ab.jpg"
+        )
+        self.assertEqual(response.content, b"")
+        self.assertIn("immutable", response["Cache-Control"])
+        # nginx does ranges itself
+        self.assertEqual(ranged.status_code, 200)
+        self.assertIn("X-Accel-Redirect", ranged)
+
+    def test_x_accel_redirect_still_answers_304(self):
+        etag = self.get()["ETag"]
+        with self.settings(MEDIA_SENDFILE="x-accel-redirect"):
+            response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn("X-Accel-Redirect", response)
+
+    def test_missing_and_escaping_paths_are_404(self):
+        for path in ("movies/nope.jpg", "../settings.py", "movies"):
+            with self.assertRaises(Http404):
+                self.get(path)
+        self.assertEqual(self.get(method="post").status_code, 405)
+
+
+# =========================
+# PROCESS WARM-UP (booktheticket/warmup.py)
+# =========================
+class WarmupTests(TransactionTestCase):
+    databases = "__all__"
+
+    @override_settings(WARMUP_TEMPLATES=["missing.html", "movies/poster.html", "movies/seat_selection.html"])
+    def test_templates_past_a_missing_one_are_compiled(self):
+        with mock.patch("booktheticket.warmup.get_template", wraps=get_template) as compiled, \
+                self.assertLogs("booktheticket.warmup", "ERROR") as logs:
+            timings = warm_code()
+
+        self.assertEqual(set(timings), {"urls", "templates"})
+        self.assertEqual(
+            [c.args[0] for c in compiled.call_args_list],
+            ["missing.html", "movies/poster.html", "movies/seat_selection.html"],
+        )
+        self.assertIn("Could not warm template missing.html", logs.output[0])
+
+    def test_worker_opens_every_connection(self):
+        aliases = list(connections)
+        broken = aliases[0]
+        with mock.patch.object(
+            connections[broken], "ensure_connection", side_effect=OperationalError("no such database")
+        ), self.assertLogs("booktheticket.warmup", "ERROR") as logs:
+            timings = warm_worker()
+
+        self.assertEqual(set(timings), {"database"})
+        self.assertIn(f"Could not open database {broken}", logs.output[0])
+        for alias in aliases[1:]:
+            self.assertIsNotNone(connections[alias].connection, alias)
+
+
+# =========================
+# SQLITE BACKEND (booktheticket/db/sqlite3)
+# =========================
+class SQLiteBackendTests(SimpleTestCase):
+    """Against a scratch file, whatever the test databases are."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "backend.sqlite3")
+
+    def connect(self, **options):
+        handler = ConnectionHandler({
+            "default": {"ENGINE": "booktheticket.db.sqlite3", "NAME": self.path, "OPTIONS": options},
+        })
+        connection = handler["default"]
+        self.addCleanup(connection.close)
+        return connection
+
+    @contextmanager
+    def atomic(self, connection):
+        # transaction.atomic() for a connection outside DATABASES
+        with mock.patch("django.db.transaction.get_connection", return_value=connection):
+            with transaction.atomic():
+                yield
+
+    def pragma(self, connection, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_new_connections_get_the_pragmas(self):
+        connection = self.connect(timeout=7)
+        self.assertEqual(self.pragma(connection, "journal_mode"), "wal")
+        self.assertEqual(self.pragma(connection, "synchronous"), 1)  # NORMAL
+        self.assertEqual(self.pragma(connection, "busy_timeout"), 7000)
+
+        connection = self.connect(synchronous="FULL", timeout=0.5)
+        self.assertEqual(self.pragma(connection, "synchronous"), 2)
+        self.assertEqual(self.pragma(connection, "busy_timeout"), 500)
+
+    def test_atomic_begins_immediate(self):
+        connection = self.connect()
+        with CaptureQueriesContext(connection) as queries, self.atomic(connection):
+            pass
+        self.assertEqual(queries[0]["sql"], "BEGIN IMMEDIATE")
+
+    def test_atomic_takes_the_write_lock_up_front(self):
+        writer, other = self.connect(), self.connect(timeout=0.05)
+        with writer.cursor() as cursor:
+            cursor.execute("CREATE TABLE t (n integer)")
+
+        with self.atomic(writer):
+            # Nothing written yet, and the other connection already waits
+            with self.assertRaisesRegex(OperationalError, "locked"):
+                with other.cursor() as cursor:
+                    cursor.execute("INSERT INTO t VALUES (1)")
+
+    def test_deferred_mode_waits_for_the_first_write(self):
+        reader, other = self.connect(transaction_mode="deferred"), self.connect(timeout=0.05)
+        with reader.cursor() as cursor:
+            cursor.execute("CREATE TABLE t (n integer)")
+
+        with self.atomic(reader):
+            with other.cursor() as cursor:
+                cursor.execute("INSERT INTO t VALUES (1)")
+        self.assertEqual(reader.transaction_mode, "DEFERRED")
+
+    def test_unknown_transaction_mode(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.connect(transaction_mode="eventually").ensure_connection()
+
+
+# =========================
+# READ REPLICAS AND PINNING
+# =========================
+@override_settings(DATABASE_REPLICAS=["replica1"], REPLICA_PIN_SECONDS=15)
+class RouterTests(SimpleTestCase):
+    """Routing decisions only; ``ReplicaRoutingTests`` runs real queries."""
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def test_catalog_reads_go_to_a_replica(self):
+        for model in (Movie, Theater):
+            self.assertEqual(self.router.db_for_read(model), "replica1")
+        for model in (User, Booking, BookingHistory):
+            self.assertEqual(self.router.db_for_read(model), "default")
+
+    def test_pinned_reads_go_to_the_primary(self):
+        token = _pinned.set(True)
+        try:
+            self.assertEqual(self.router.db_for_read(Movie), "default")
+        finally:
+            _pinned.reset(token)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_reads_the_primary(self):
+        self.assertEqual(read_db(), "default")
+        self.assertEqual(self.router.db_for_read(Movie), "default")
+
+    def test_writes_and_migrations_stay_off_replicas(self):
+        self.assertEqual(self.router.db_for_write(Movie), "default")
+        self.assertFalse(self.router.allow_migrate("replica1", "movies", "movie"))
+        self.assertIsNone(self.router.allow_migrate("default", "movies", "movie"))
+
+    @override_settings(SEAT_SHARDS=["default", "shard1"])
+    def test_seats_follow_their_theater(self):
+        theater = Theater(id=1, shard="shard1")
+        seat = Seat(theater=theater)
+        self.assertEqual(SeatShardRouter().db_for_read(Seat, instance=seat), "shard1")
+        self.assertEqual(SeatShardRouter().db_for_read(Seat, instance=Theater(shard="")), "default")
+        self.assertIsNone(SeatShardRouter().db_for_read(Movie))
+
+    # 📌 Pinning
+    def run_request(self, write=None, cookie=None):
+        seen = []
+
+        def view(request):
+            seen.append(read_db())
+            if write is not None:
+                self.router.db_for_write(write)
+            return HttpResponse()
+
+        request = self.factory.get("/")
+        if cookie is not None:
+            request.COOKIES[PIN_COOKIE] = cookie
+        return PrimaryPinningMiddleware(view)(request), seen[0]
+
+    def test_a_write_pins_the_next_requests(self):
+        response, _ = self.run_request(write=Booking)
+
+        pin = response.cookies[PIN_COOKIE]
+        self.assertEqual(pin["max-age"], 15)
+        self.assertTrue(pin["httponly"])
+
+        _, db = self.run_request(cookie=pin.value)
+        self.assertEqual(db, "default")
+
+    def test_session_saves_do_not_pin(self):
+        response, _ = self.run_request(write=Session)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_expired_or_bad_pins_read_the_replica(self):
+        for cookie in ("1", "not a time", ""):
+            self.assertEqual(self.run_request(cookie=cookie)[1], "replica1", cookie)
+
+    def test_pin_does_not_outlive_the_request(self):
+        self.run_request(cookie="9999999999")
+        self.assertEqual(read_db(), "replica1")
+
+
+@skipUnless(settings.DATABASE_REPLICAS, "set DATABASE_REPLICA_URLS (tests mirror default)")
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Against a real replica alias, which the test runner points at the
+    primary (``TEST: MIRROR``).  Rows are committed, so the mirror's own
+    connection sees them.
+    """
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.replica = settings.DATABASE_REPLICAS[0]
+        replicas = self.settings(DATABASE_REPLICAS=[self.replica])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+
+        self.theater, self.seats = make_show()
+        self.user = User.objects.create(username="replica-reader", email="reader@example.com")
+        self.client.force_login(self.user)
+
+    def test_catalog_reads_use_the_mirror(self):
+        movies = Movie.objects.filter(id=self.theater.movie_id)
+        self.assertEqual(movies.db, self.replica)
+        self.assertTrue(movies.exists())
+
+    def test_booking_reads_the_show_from_the_primary(self):
+        url = reverse("book_seats", args=[self.theater.id])
+
+        with CaptureQueriesContext(connections[self.replica]) as replica:
+            self.assertEqual(self.client.get(url).status_code, 200)
+            self.client.cookies.pop(PIN_COOKIE, None)
+            response = self.client.post(url, {"seats": [self.seats["A1"].id]})
+            self.assertRedirects(response, reverse("payment_success"), fetch_redirect_response=False)
+            self.client.cookies.pop(PIN_COOKIE, None)
+            self.client.get(reverse("payment_success"))
+
+        self.assertEqual(
+            [q["sql"] for q in replica.captured_queries if "movies_theater" in q["sql"]], []
+        )
+        self.assertTrue(self.theater.booking_set.filter(user=self.user).exists())
+
+    def test_writes_pin_the_next_request_to_the_primary(self):
+        url = reverse("book_seats", args=[self.theater.id])
+        response = self.client.post(url, {"seats": [self.seats["A2"].id]})
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        with CaptureQueriesContext(connections[self.replica]) as replica:
+            self.assertEqual(self.client.get(reverse("movie_list")).status_code, 200)
+        self.assertEqual(replica.captured_queries, [])
+
+        self.client.cookies.pop(PIN_COOKIE)
+        with CaptureQueriesContext(connections[self.replica]) as replica:
+            self.client.get(reverse("movie_list"))
+        self.assertTrue(replica.captured_queries)
+
+
+# =========================
+# SEAT SHARDS
+# =========================
+class ShardingTests(TransactionTestCase):
+    """
+    One show per configured shard (just ``default`` without
+    SEAT_SHARD_URLS).  Transactional, because ``fan_out`` reads each
+    shard from its own thread and connection.
+    """
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="sharded")
+        self.other = User.objects.create(username="sharded-other")
+        self.shows = {}
+        for n, alias in enumerate(shard_aliases()):
+            self.shows[alias] = make_show(name=f"Sharded {n}", shard=alias)
+
+    def book(self, user, theater, seats, *numbers):
+        ids = [seats[number].id for number in numbers]
+        self.assertTrue(hold_seats(theater, user, ids).ok)
+        return book_held_seats(theater, user, ids)
+
+    def test_seats_live_only_on_their_shows_shard(self):
+        for alias, (theater, seats) in self.shows.items():
+            self.assertEqual({seat._state.db for seat in seats.values()}, {alias})
+            for other in shard_aliases():
+                expected = 4 if other == alias else 0
+                self.assertEqual(Seat.objects.using(other).filter(theater_id=theater.id).count(), expected)
+
+    def test_reads_are_merged_across_shards(self):
+        for theater, seats in self.shows.values():
+            self.book(self.user, theater, seats, "A1", "A2")
+            self.assertTrue(hold_seats(theater, self.other, [seats["A3"].id]).ok)
+
+        counts = seat_counts([theater for theater, _ in self.shows.values()], timezone.now())
+        self.assertEqual(
+            counts, {theater.id: (4, 2, 1) for theater, _ in self.shows.values()}
+        )
+
+        bookings = user_bookings(self.user)
+        self.assertEqual(len(bookings), 2 * len(self.shows))
+        self.assertEqual(
+            {booking.theater for booking in bookings}, {theater for theater, _ in self.shows.values()}
+        )
+
+        stats = booking_stats()
+        self.assertEqual(stats["total"], 2 * len(self.shows))
+        self.assertEqual(stats["revenue"], 2 * len(self.shows) * 200)
+
+    @skipUnless(len(shard_aliases()) > 1, "set SEAT_SHARD_URLS")
+    @override_settings(DATABASE_REPLICAS=["no-such-replica"])
+    def test_rebalance_reads_placements_from_the_primary(self):
+        # A replica read (possibly of a stale placement) would fail here.
+        token = _pinned.set(False)
+        self.addCleanup(_pinned.reset, token)
+        source, target = shard_aliases()[:2]
+        theater, seats = self.shows[source]
+        self.book(self.user, theater, seats, "A1")
+        booked_at = Booking.objects.using(source).get(theater_id=theater.id).booked_at
+
+        call_command("rebalance_shards", "--theater", str(theater.id), "--to", target, stdout=StringIO())
+
+        self.assertEqual(Theater.objects.get(id=theater.id).shard, target)
+        self.assertFalse(Seat.objects.using(source).filter(theater_id=theater.id).exists())
+        self.assertEqual(Seat.objects.using(target).filter(theater_id=theater.id).count(), 4)
+        booking = Booking.objects.using(target).select_related("seat").get(theater_id=theater.id)
+        self.assertEqual((booking.seat.seat_number, booking.booked_at), ("A1", booked_at))
+
+    def test_deleting_a_show_clears_its_shard(self):
+        for alias, (theater, seats) in self.shows.items():
+            self.book(self.user, theater, seats, "A1")
+            theater.delete()
+            self.assertFalse(Seat.objects.using(alias).filter(theater_id=theater.id).exists())
+            self.assertFalse(Booking.objects.using(alias).filter(theater_id=theater.id).exists())
+
+    def test_deleting_a_user_clears_every_shard(self):
+        for theater, seats in self.shows.values():
+            self.book(self.user, theater, seats, "A1")
+            self.assertTrue(hold_seats(theater, self.user, [seats["A2"].id]).ok)
+            self.assertTrue(hold_seats(theater, self.other, [seats["A3"].id]).ok)
+
+        user_id = self.user.id
+        self.user.delete()
+
+        for alias, (theater, seats) in self.shows.items():
+            self.assertFalse(Booking.objects.using(alias).filter(user_id=user_id).exists(), alias)
+            self.assertFalse(Seat.objects.using(alias).filter(reserved_by_id=user_id).exists(), alias)
+            self.assertEqual(theater.seats.get(seat_number="A3").reserved_by_id, self.other.id)
+        self.assertEqual(len(user_bookings(self.other)), 0)
+
+
+# =========================
+# BOOKING EVENT FEED
+# =========================
+@override_settings(BOOKING_EVENTS_SETTLE_SECONDS=2)
+class BookingEventFeedTests(TransactionTestCase):
+    """Transactional, like ShardingTests: ``read_events`` fans out."""
+    databases = "__all__"
+
+    def setUp(self):
+        self.shows = {
+            alias: make_show(name=f"Feed {n}", shard=alias)[0]
+            for n, alias in enumerate(shard_aliases())
+        }
+
+    def add(self, alias, seat_number, age):
+        theater = self.shows[alias]
+        return BookingEvent.objects.using(alias).create(
+            kind=BookingEvent.HOLD, theater_id=theater.id, movie_id=theater.movie_id,
+            seat_id=1, seat_number=seat_number, created_at=timezone.now() - timedelta(seconds=age),
+        )
+
+    def read_all(self, limit):
+        cursor, batches = None, []
+        while True:
+            events, cursor, more = read_events(cursor, limit)
+            batches.append([(event._state.db, event.seat_number) for event in events])
+            if not more:
+                return batches, cursor
+
+    def test_cursor_continues_across_batches(self):
+        for alias in shard_aliases():
+            for n in range(5):
+                self.add(alias, f"A{n}", age=60)
+
+        batches, cursor = self.read_all(limit=2)
+
+        self.assertEqual(len(batches), 3)
+        self.assertEqual(
+            sorted(event for batch in batches for event in batch),
+            sorted((alias, f"A{n}") for alias in shard_aliases() for n in range(5)),
+        )
+        self.assertEqual(read_events(cursor, 2)[0], [])
+
+    def test_batch_stops_at_the_first_unsettled_event(self):
+        alias = shard_aliases()[0]
+        self.add(alias, "A1", age=60)
+        late = self.add(alias, "A2", age=0)
+        # A later id from a process whose clock is behind
+        self.add(alias, "A3", age=60)
+
+        events, cursor, more = read_events(None, 10)
+        self.assertEqual([event.seat_number for event in events], ["A1"])
+        self.assertFalse(more)
+
+        BookingEvent.objects.using(alias).filter(id=late.id).update(
+            created_at=timezone.now() - timedelta(seconds=60)
+        )
+        events, cursor, more = read_events(cursor, 10)
+        self.assertCountEqual([event.seat_number for event in events], ["A2", "A3"])
+
+
+# =========================
+# ARCHIVING PAST SHOWS
+# =========================
+@override_settings(DEFAULT_SEAT_PRICES={"standard": 200, "premium": 300})
+class ArchivePastShowsTests(TransactionTestCase):
+    """A past and a future show on every shard; transactional for fan_out."""
+    databases = "__all__"
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username="archived")
+        self.past, self.future = [], []
+        for n, alias in enumerate(shard_aliases()):
+            past, seats = make_show(name=f"Past {n}", shard=alias)
+            past.seats.filter(seat_number="A2").update(category="premium")
+            self.book(past, seats, "A1", "A2")
+            Theater.objects.filter(id=past.id).update(date=timezone.localdate() - timedelta(days=40))
+            self.past.append(past)
+
+            future, seats = make_show(name=f"Future {n}", shard=alias)
+            self.book(future, seats, "A3")
+            self.future.append(future)
+
+    def book(self, theater, seats, *numbers):
+        ids = [seats[number].id for number in numbers]
+        self.assertTrue(hold_seats(theater, self.user, ids).ok)
+        book_held_seats(theater, self.user, ids)
+
+    def archive(self):
+        out = StringIO()
+        call_command("archive_past_shows", "--batch-size", "1", stdout=out)
+        return out.getvalue()
+
+    def test_past_bookings_are_copied_with_their_amounts(self):
+        self.archive()
+
+        self.assertCountEqual(
+            BookingHistory.objects.values_list("theater_id", "seat_number", "amount", "user_id"),
+            [
+                (theater.id, number, Decimal(amount), self.user.id)
+                for theater in self.past
+                for number, amount in [("A1", 200), ("A2", 300)]
+            ],
+        )
+
+    def test_past_shows_are_emptied_and_future_ones_left_alone(self):
+        self.archive()
+
+        for past, future in zip(self.past, self.future):
+            shard = shard_of(past)
+            self.assertFalse(Seat.objects.using(shard).filter(theater_id=past.id).exists())
+            self.assertFalse(Booking.objects.using(shard).filter(theater_id=past.id).exists())
+            self.assertEqual(Seat.objects.using(shard).filter(theater_id=future.id).count(), 4)
+            self.assertEqual(Booking.objects.using(shard).filter(theater_id=future.id).count(), 1)
+            # The show itself stays, for the history rows to point at
+            self.assertTrue(Theater.objects.filter(id=past.id).exists())
+
+    def test_second_run_is_a_no_op(self):
+        shows = len(shard_aliases())
+        self.assertIn(f"archived {2 * shows} bookings from {shows} shows", self.archive())
+
+        self.assertIn("archived 0 bookings from 0 shows", self.archive())
+        self.assertEqual(BookingHistory.objects.count(), 2 * shows)
+
+    def test_profile_and_stats_still_count_archived_bookings(self):
+        before = booking_stats()
+        self.archive()
+
+        after = booking_stats()
+        self.assertEqual((after["total"], after["revenue"]), (before["total"], before["revenue"]))
+        self.assertEqual(after["total"], 3 * len(shard_aliases()))
+        self.assertEqual(len(user_bookings(self.user)), 3 * len(shard_aliases()))
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("profile"))
+        for theater in self.past + self.future:
+            self.assertContains(response, theater.movie.name)
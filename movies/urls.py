@@ -5,6 +5,9 @@ urlpatterns = [
     path('', views.movie_list, name='movie_list'),
     path('<int:movie_id>/theaters/', views.theater_list, name='theater_list'),
     path('theater/<int:theater_id>/seats/book/', views.book_seats, name='book_seats'),
+    path('theater/<int:theater_id>/seats/best/', views.best_seats, name='best_seats'),
+    path('theater/<int:theater_id>/queue/', views.waiting_room_status, name='waiting_room_status'),
     path("payment/success/", views.payment_success, name="payment_success"),
+    path("events/", views.booking_events, name="booking_events"),
 
 ]
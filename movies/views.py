@@ -4,11 +4,28 @@ from django.db import IntegrityError
 from django.utils import timezone
 from datetime import timedelta
 from django.contrib.admin.views.decorators import staff_member_required
-from django.db.models import Count
-from .models import Movie, Theater, Seat, Booking
+from django.db.models import F
+from .models import Movie, Theater
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse
+from .allocator import MAX_GROUP_SIZE, allocate_best
+from .events import read_events
+from .holds import book_held_seats, hold_seats, release_expired
+from .pricing import price_table
+from .ratelimit import ratelimit
+from .recommendations import similar_movies
+from .shards import seat_counts
+from .waiting_room import (
+    WaitingRoomBusy,
+    current_ticket,
+    extend_admission,
+    leave_waiting_room,
+    queue_busy,
+    waiting_room_required,
+)
 
 
 
@@ -46,26 +63,53 @@ def movie_list(request):
 
 def theater_list(request, movie_id):
     movie = get_object_or_404(Movie, id=movie_id)
-    theaters = Theater.objects.filter(movie=movie)
+    now = timezone.now()
+
+    # 🎟 Seats left / held for every show from one GROUP BY query
+    # (one per seat shard involved, whatever the number of shows)
+    # Past shows are over (and eventually archived); undated shows always list
+    theaters = list(
+        Theater.objects
+        .filter(movie=movie)
+        .exclude(date__lt=timezone.localdate(now))
+        .order_by(F("date").asc(nulls_first=True), "time", "name")
+    )
+    counts = seat_counts(theaters, now)
+
+    for theater in theaters:
+        theater.seats_total, theater.seats_booked, theater.seats_held = counts.get(theater.id, (0, 0, 0))
+        theater.seats_left = theater.seats_total - theater.seats_booked - theater.seats_held
+        theater.sold_out = theater.seats_total > 0 and theater.seats_left == 0
 
     return render(
         request,
         'movies/theater_list.html',
-        {'movie': movie, 'theaters': theaters}
+        {
+            'movie': movie,
+            'theaters': theaters,
+            'also_booked': similar_movies(movie),  # precomputed, see recommendations.py
+        }
     )
 
 
 @login_required(login_url='/users/login/')
+@ratelimit("10/m", key="user")
+@ratelimit("30/m", key="ip")
+@waiting_room_required
 def book_seats(request, theater_id):
-    theater = get_object_or_404(Theater, id=theater_id)
+    # Holds write to this show's shard: read its placement from the primary,
+    # not a replica that may not have seen a rebalance yet.
+    theater = get_object_or_404(
+        Theater.objects.using("default").select_related("movie"), id=theater_id
+    )
 
-    # 🔄 CLEAN EXPIRED RESERVATIONS
-    seats = Seat.objects.filter(theater=theater)
-    for seat in seats:
-        seat.release_if_expired()
+    # 🔄 CLEAN EXPIRED RESERVATIONS (one UPDATE)
+    release_expired(theater)
+    seats = theater.seats.all()
+    prices = price_table(theater)  # cached per show
 
     if request.method == "POST":
-        seat_ids = request.POST.getlist("seats")
+        seat_ids = [s for s in request.POST.getlist("seats") if s.isdigit()]
 
         if not seat_ids:
             return render(
@@ -74,39 +118,43 @@ def book_seats(request, theater_id):
                 {
                     "theater": theater,
                     "seats": seats,
+                    "prices": prices,
                     "error": "Please select at least one seat."
                 }
             )
 
-        # 🔐 RESERVE SEATS FOR 5 MINUTES
-        reserved_until = timezone.now() + timedelta(minutes=5)
-
-        for seat_id in seat_ids:
-            seat = get_object_or_404(Seat, id=seat_id, theater=theater)
-
-            # ❌ BLOCK if already booked or reserved by someone else
-            if seat.is_booked or (
-                seat.is_reserved() and seat.reserved_by != request.user
-            ):
-                return render(
-                    request,
-                    "movies/seat_selection.html",
-                    {
-                        "theater": theater,
-                        "seats": seats,
-                        "error": "Some seats are no longer available."
-                    }
-                )
-
-            seat.reserved_by = request.user
-            seat.reserved_until = reserved_until
-            seat.save()
+        # 🔐 RESERVE SEATS FOR 5 MINUTES (against the versions the user saw)
+        versions = {
+            seat_id: request.POST[f"version_{seat_id}"]
+            for seat_id in seat_ids
+            if request.POST.get(f"version_{seat_id}", "").isdigit()
+        }
+        hold = hold_seats(theater, request.user, seat_ids, versions)
+
+        # ❌ BLOCK if any seat was booked or held by someone else
+        if not hold.ok:
+            return render(
+                request,
+                "movies/seat_selection.html",
+                {
+                    "theater": theater,
+                    "seats": seats,
+                    "prices": prices,
+                    "lost_seats": hold.lost,
+                    "error": "Some seats are no longer available. Please pick again."
+                }
+            )
+
+        reserved_until = hold.reserved_until
 
         # ⏳ Store session for payment
-        request.session["seat_ids"] = seat_ids
+        request.session["seat_ids"] = hold.held
         request.session["theater_id"] = theater_id
         request.session["reservation_expires"] = reserved_until.isoformat()
 
+        # 🎟 Keep our waiting-room slot until the hold runs out
+        extend_admission(request, theater_id, reserved_until)
+
         return redirect("payment_success")  # you can keep your Razorpay/Stripe stub
 
     return render(
@@ -114,10 +162,66 @@ def book_seats(request, theater_id):
         "movies/seat_selection.html",
         {
             "theater": theater,
-            "seats": seats
+            "seats": seats,
+            "prices": prices,
         }
     )
+
+
+@login_required(login_url='/users/login/')
+@ratelimit("10/m", key="user")
+@ratelimit("30/m", key="ip")
+@waiting_room_required
+def best_seats(request, theater_id):
+    """
+    POST ``count`` -> hold the best ``count`` seats together and return
+    them as JSON, ready for payment.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST a seat count."}, status=405)
+
+    theater = get_object_or_404(Theater.objects.using("default"), id=theater_id)
+
+    count = request.POST.get("count", "")
+    if not count.isdigit() or not 1 <= int(count) <= MAX_GROUP_SIZE:
+        return JsonResponse(
+            {"error": f"Choose between 1 and {MAX_GROUP_SIZE} seats."},
+            status=400
+        )
+
+    hold = allocate_best(theater, request.user, int(count))
+    if not hold.ok:
+        return JsonResponse(
+            {"error": "Not enough seats left together. Try a smaller group."},
+            status=409
+        )
+
+    # ⏳ Same session handoff as book_seats
+    request.session["seat_ids"] = hold.held
+    request.session["theater_id"] = theater_id
+    request.session["reservation_expires"] = hold.reserved_until.isoformat()
+    extend_admission(request, theater_id, hold.reserved_until)
+
+    seats = theater.seats.filter(id__in=hold.held).order_by("id")
+    return JsonResponse({
+        "seats": [seat.seat_number for seat in seats],
+        "seat_ids": hold.held,
+        "reserved_until": hold.reserved_until.isoformat(),
+        "payment_url": reverse("payment_success"),
+    })
+
+
+@login_required(login_url='/users/login/')
+def waiting_room_status(request, theater_id):
+    try:
+        _, ticket = current_ticket(request, theater_id)
+    except WaitingRoomBusy:
+        return queue_busy()
+    return JsonResponse(ticket.as_dict())
+
+
 @login_required
+@ratelimit("10/m", key="user", methods=None)
 def payment_success(request):
     seat_ids = request.session.get("seat_ids")
     theater_id = request.session.get("theater_id")
@@ -125,39 +229,25 @@ def payment_success(request):
     if not seat_ids or not theater_id:
         return redirect("movie_list")
 
-    theater = get_object_or_404(Theater, id=theater_id)
-    booked_seats = []
-
-    for seat_id in seat_ids:
-        seat = get_object_or_404(Seat, id=seat_id)
-
-        # ❌ EXPIRED RESERVATION
-        if not seat.is_reserved() or seat.reserved_by != request.user:
-            continue
-
-        Booking.objects.create(
-            user=request.user,
-            seat=seat,
-            movie=theater.movie,
-            theater=theater
-        )
-
-        seat.is_booked = True
-        seat.reserved_by = None
-        seat.reserved_until = None
-        seat.save()
+    theater = get_object_or_404(
+        Theater.objects.using("default").select_related("movie"), id=theater_id
+    )
+    # ❌ Expired or lost holds are skipped
+    booked = book_held_seats(theater, request.user, seat_ids)
+    booked_seats = [seat.seat_number for seat in booked]
 
-        booked_seats.append(seat.seat_number)
+    # 🚪 Checkout finished: hand our slot to the next person in the queue
+    leave_waiting_room(request, theater_id)
 
     # EMAIL (reuse your existing email logic)
     if booked_seats:
-        # Calculate total amount (₹200 per seat)
-        total_amount = len(booked_seats) * 200
+        # Total of what each seat was charged (its category's show price)
+        total_amount = sum(seat.price for seat in booked)
         
         # Get booking IDs
-        booking_ids = [str(booking.id) for booking in Booking.objects.filter(
+        booking_ids = [str(booking.id) for booking in theater.booking_set.filter(
             user=request.user, 
-            seat__in=Seat.objects.filter(id__in=seat_ids)
+            seat_id__in=seat_ids
         ).order_by('-booked_at')[:len(booked_seats)]]
         
         subject = "🎟 Ticket Booking Confirmation"
@@ -184,3 +274,25 @@ def payment_success(request):
 
 
     return redirect("profile")
+
+
+@staff_member_required
+def booking_events(request):
+    """
+    Hold/book/release feed for downstream systems (see movies/events.py).
+
+    GET ?cursor=<cursor from the previous page>&limit=1000.  Start without
+    a cursor; fetch again straight away while ``more``, else every few
+    seconds.
+    """
+    try:
+        limit = int(request.GET.get("limit", 1000))
+        events, cursor, more = read_events(request.GET.get("cursor"), limit)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({
+        "events": [event.as_dict() for event in events],
+        "cursor": cursor,
+        "more": more,
+    })
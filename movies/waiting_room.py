@@ -0,0 +1,251 @@
+"""
+Waiting room (admission control) for the seat page.
+
+Every theater gets a small queue in the Django cache.  Visitors take a
+numbered ticket and at most ``WAITING_ROOM_MAX_ACTIVE`` tickets per
+theater are admitted at a time; everybody else waits their turn.  An
+admitted ticket keeps its slot for a short lease that is extended while
+the user is choosing and holding seats, and gives it back as soon as the
+booking completes or the lease runs out.
+
+The queue has to live in a cache every worker shares (Memcached, see
+``CACHES`` in settings); with LocMem each gunicorn worker would run its
+own queue, so ``gunicorn.conf.py`` runs a single worker that way.
+"""
+import math
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import render
+
+SESSION_KEY = "waiting_room_tickets"
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class WaitingRoomBusy(Exception):
+    """The queue's lock couldn't be taken in time; try again shortly."""
+
+
+@dataclass
+class Ticket:
+    number: int
+    position: int
+    eta_seconds: int
+
+    @property
+    def admitted(self):
+        return self.position == 0
+
+    @property
+    def ahead(self):
+        """People in front of this ticket (position 1 is next in line)."""
+        return max(0, self.position - 1)
+
+    def as_dict(self):
+        return {
+            "ticket": self.number,
+            "admitted": self.admitted,
+            "position": self.position,
+            "ahead": self.ahead,
+            "eta_seconds": self.eta_seconds,
+        }
+
+
+class WaitingRoom:
+    """
+    Cache-backed FIFO queue in front of one theater.
+
+    ``seq`` is the last ticket handed out, ``served`` the last ticket
+    admitted, and ``active`` maps admitted tickets to their lease expiry.
+    All three are only changed under ``_lock()``, so the backend just needs
+    an atomic ``add()``.  They expire ``WAITING_ROOM_STATE_SECONDS`` after
+    the last change rather than never, so a quiet theater's queue doesn't
+    sit in the cache forever.
+    """
+
+    def __init__(self, theater_id, cache_backend=None):
+        self.cache = cache_backend or cache
+        self.max_active = _setting("WAITING_ROOM_MAX_ACTIVE", 50)
+        self.grace_seconds = _setting("WAITING_ROOM_ADMIT_GRACE_SECONDS", 60)
+        self.lease_seconds = _setting("WAITING_ROOM_LEASE_SECONDS", 600)
+        self.checkout_seconds = _setting("WAITING_ROOM_AVG_CHECKOUT_SECONDS", 180)
+        self.state_seconds = _setting("WAITING_ROOM_STATE_SECONDS", 86400)
+
+        prefix = f"waiting_room:{theater_id}"
+        self.seq_key = f"{prefix}:seq"
+        self.served_key = f"{prefix}:served"
+        self.active_key = f"{prefix}:active"
+        self.lock_key = f"{prefix}:lock"
+
+    @contextmanager
+    def _lock(self):
+        # cache.add() is atomic on every backend, so it doubles as a mutex.
+        # The 5 s expiry frees it if its holder dies mid-update.
+        deadline = time.monotonic() + 2
+        while not self.cache.add(self.lock_key, 1, timeout=5):
+            if time.monotonic() >= deadline:
+                raise WaitingRoomBusy(self.lock_key)
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            self.cache.delete(self.lock_key)
+
+    def _admit(self):
+        """Drop expired leases and admit waiting tickets into free slots."""
+        now = time.time()
+        state = self.cache.get_many([self.seq_key, self.served_key, self.active_key])
+        issued = state.get(self.seq_key, 0)
+        served = state.get(self.served_key, 0)
+        active = {
+            number: expires
+            for number, expires in state.get(self.active_key, {}).items()
+            if expires > now
+        }
+
+        while len(active) < self.max_active and served < issued:
+            served += 1
+            active[served] = now + self.grace_seconds
+
+        self.cache.set_many(
+            {self.seq_key: issued, self.served_key: served, self.active_key: active},
+            timeout=self.state_seconds,
+        )
+        return active, served
+
+    def join(self):
+        with self._lock():
+            number = self.cache.get(self.seq_key, 0) + 1
+            self.cache.set(self.seq_key, number, timeout=self.state_seconds)
+        return self.status(number)
+
+    def status(self, number):
+        """
+        Return the ticket's place in the queue, or ``None`` if it was
+        already admitted and has since been released or expired.
+        """
+        with self._lock():
+            active, served = self._admit()
+
+        if number in active:
+            return Ticket(number, 0, 0)
+        if number <= served:
+            return None
+
+        position = number - served
+        eta = math.ceil(position / self.max_active) * self.checkout_seconds
+        return Ticket(number, position, eta)
+
+    def touch(self, number, until=None):
+        """Extend an admitted ticket's lease (default: one full lease)."""
+        until = until or time.time() + self.lease_seconds
+        with self._lock():
+            active = self.cache.get(self.active_key, {})
+            if number not in active:
+                return False
+            active[number] = max(active[number], until)
+            self.cache.set(self.active_key, active, timeout=self.state_seconds)
+        return True
+
+    def release(self, number):
+        """Give the slot back and let the next ticket in."""
+        with self._lock():
+            active = self.cache.get(self.active_key, {})
+            if active.pop(number, None) is not None:
+                self.cache.set(self.active_key, active, timeout=self.state_seconds)
+                self._admit()
+
+
+# =========================
+# SESSION HELPERS
+# =========================
+def _ticket_number(request, theater_id):
+    return request.session.get(SESSION_KEY, {}).get(str(theater_id))
+
+
+def _remember_ticket(request, theater_id, number):
+    tickets = request.session.get(SESSION_KEY, {})
+    if number is None:
+        tickets.pop(str(theater_id), None)
+    else:
+        tickets[str(theater_id)] = number
+    request.session[SESSION_KEY] = tickets
+
+
+def current_ticket(request, theater_id):
+    """Look up (or take) this session's ticket for the theater."""
+    room = WaitingRoom(theater_id)
+    number = _ticket_number(request, theater_id)
+    ticket = room.status(number) if number else None
+
+    if ticket is None:
+        ticket = room.join()
+        _remember_ticket(request, theater_id, ticket.number)
+
+    return room, ticket
+
+
+def extend_admission(request, theater_id, until):
+    number = _ticket_number(request, theater_id)
+    if number:
+        try:
+            WaitingRoom(theater_id).touch(number, until.timestamp())
+        except WaitingRoomBusy:
+            pass  # the lease taken on the seat page still runs
+
+
+def leave_waiting_room(request, theater_id):
+    number = _ticket_number(request, theater_id)
+    if number:
+        try:
+            WaitingRoom(theater_id).release(number)
+        except WaitingRoomBusy:
+            pass  # the slot frees itself when its lease runs out
+        _remember_ticket(request, theater_id, None)
+
+
+def queue_busy():
+    response = HttpResponse(
+        "The queue for this show is very busy. Please try again in a moment.",
+        content_type="text/plain",
+        status=503,
+    )
+    response["Retry-After"] = "2"
+    return response
+
+
+def waiting_room_required(view):
+    """
+    Only let admitted tickets through to ``view``; everybody else gets the
+    waiting room page, which refreshes itself until it is their turn.
+    """
+    @wraps(view)
+    def wrapper(request, theater_id, *args, **kwargs):
+        if not _setting("WAITING_ROOM_ENABLED", True):
+            return view(request, theater_id, *args, **kwargs)
+
+        try:
+            room, ticket = current_ticket(request, theater_id)
+            if ticket.admitted:
+                room.touch(ticket.number)
+        except WaitingRoomBusy:
+            return queue_busy()
+
+        if not ticket.admitted:
+            return render(
+                request,
+                "movies/waiting_room.html",
+                {"theater_id": theater_id, "ticket": ticket},
+            )
+
+        return view(request, theater_id, *args, **kwargs)
+
+    return wrapper
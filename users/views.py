@@ -6,6 +6,9 @@ from django.contrib import messages
 from django.utils import timezone
 
 from movies.models import Movie, Booking
+from movies.shards import user_bookings
+from movies.recommendations import recommended_for
+from movies.ratelimit import ratelimit
 from .forms import UserRegisterForm, UserUpdateForm
 
 
@@ -14,12 +17,15 @@ from .forms import UserRegisterForm, UserUpdateForm
 # =========================
 def home(request):
     movies = Movie.objects.all()
-    return render(request, 'home.html', {'movies': movies})
+    # 🍿 Based on the user's bookings; falls back to the first movies
+    recommended = recommended_for(request.user)
+    return render(request, 'home.html', {'movies': movies, 'recommended': recommended})
 
 
 # =========================
 # AUTH
 # =========================
+@ratelimit("5/h", key="ip")
 def register(request):
     if request.method == 'POST':
         form = UserRegisterForm(request.POST)
@@ -38,6 +44,7 @@ def register(request):
     return render(request, 'users/register.html', {'form': form})
 
 
+@ratelimit("10/m", key="ip")
 def login_view(request):
     if request.method == 'POST':
         form = AuthenticationForm(request, data=request.POST)
@@ -62,7 +69,7 @@ def logout_view(request):
 # =========================
 @login_required
 def profile(request):
-    bookings = Booking.objects.filter(user=request.user)
+    bookings = user_bookings(request.user)  # across seat shards
 
     if request.method == 'POST':
         u_form = UserUpdateForm(request.POST, instance=request.user)
@@ -117,40 +124,35 @@ def admin_login(request):
 
 @user_passes_test(is_admin, login_url='/admin/login/')
 def admin_dashboard(request):
-    from django.db.models import Count
-    from movies.models import Booking
-    
+    from collections import Counter
+    from movies.models import Movie, Theater
+    from movies.shards import booking_stats
+
+    # 📊 Fanned out over every seat shard (replicas where configured)
+    stats = booking_stats(recent=10)
+
     # Total bookings
-    total_bookings = Booking.objects.count()
+    total_bookings = stats["total"]
 
-    # Revenue (₹200 per booking)
-    SEAT_PRICE = 200
-    total_revenue = total_bookings * SEAT_PRICE
+    # Revenue: SUM of what each booking was actually charged
+    total_revenue = stats["revenue"]
 
     # Most popular movie
-    popular_movie_data = (
-        Booking.objects
-        .values("movie__name")
-        .annotate(count=Count("id"))
-        .order_by("-count")
-        .first()
+    popular_movie_id = max(stats["movies"], key=stats["movies"].get, default=None)
+    popular_movie = (
+        Movie.objects.filter(id=popular_movie_id).values_list("name", flat=True).first()
+        if popular_movie_id else None
     )
-    popular_movie = popular_movie_data['movie__name'] if popular_movie_data else None
-
-    # Busiest theater
-    busiest_theater_data = (
-        Booking.objects
-        .values("theater__name")
-        .annotate(count=Count("id"))
-        .order_by("-count")
-        .first()
-    )
-    busiest_theater = busiest_theater_data['theater__name'] if busiest_theater_data else None
+
+    # Busiest theater (by name, across its shows)
+    names = dict(Theater.objects.filter(id__in=stats["theaters"]).values_list("id", "name"))
+    by_name = Counter()
+    for theater_id, count in stats["theaters"].items():
+        by_name[names.get(theater_id)] += count
+    busiest_theater = by_name.most_common(1)[0][0] if by_name else None
 
     # Recent bookings
-    recent_bookings = Booking.objects.select_related(
-        "movie", "theater", "user"
-    ).order_by("-booked_at")[:10]
+    recent_bookings = stats["recent"]
 
     return render(request, 'users/admin_dashboard.html', {
         "total_bookings": total_bookings,